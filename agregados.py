@@ -0,0 +1,71 @@
+# agregados.py
+import pandas as pd
+
+from google_sheets import same_label
+
+CLAVE = ["año", "mes"]
+
+# Medidas por hoja: columna de salida -> serie por fila que se suma por (año, mes).
+# Cada hoja se agrupa una sola vez con todas sus medidas juntas.
+# "estado" y "se_uso" se comparan sin importar mayúsculas ni espacios.
+MEDIDAS = {
+    "Ingresos": {
+        "ingresos": lambda df: df["monto"],
+        "registros_ingresos": lambda df: 1,
+    },
+    "Gastos Fijos": {
+        "gastos_fijos": lambda df: df["monto"].where(same_label(df["estado"], "pagado"), 0),
+    },
+    "Deudas": {
+        "deudas": lambda df: df["monto_cuota"] * df["cuotas_mes"],
+        "deudas_sin_cuotas": lambda df: (df["cuotas_mes"] == 0).astype(int),
+    },
+    "Provisiones": {
+        "provisiones_usadas": lambda df: df["monto_usado"],
+        "provisiones_guardadas": lambda df: df["monto"],
+        "provisiones_usadas_sin_monto": lambda df: (same_label(df["se_uso"], "si") & (df["monto_usado"] == 0)).astype(int),
+        "provisiones_sin_fondo": lambda df: (df["monto"] == 0).astype(int),
+    },
+    "Ahorros": {
+        "ahorros_usados": lambda df: df["monto_retirado"],
+        "ahorros_guardados": lambda df: df["monto_ingreso"],
+    },
+}
+
+COLUMNAS = [col for medidas in MEDIDAS.values() for col in medidas]
+
+
+def _agrupar_hoja(df, medidas):
+    # Una hoja vacía (o que no se pudo leer) no aporta meses
+    if df.empty or not set(CLAVE) <= set(df.columns):
+        return pd.DataFrame(columns=list(medidas), index=pd.MultiIndex.from_tuples([], names=CLAVE))
+    valores = pd.DataFrame({col: fn(df) for col, fn in medidas.items()}, index=df.index)
+    valores[CLAVE] = df[CLAVE]
+    return valores.groupby(CLAVE).sum()
+
+
+def calcular_agregados_mensuales(df_hojas):
+    # Tabla con una fila por (año, mes) y todas las medidas que usan las pestañas
+    partes = [_agrupar_hoja(df_hojas.get(hoja, pd.DataFrame()), medidas) for hoja, medidas in MEDIDAS.items()]
+    tabla = pd.concat(partes, axis=1).reindex(columns=COLUMNAS).fillna(0).sort_index()
+
+    tabla["con_ingresos"] = tabla["registros_ingresos"] > 0
+    tabla["gasto_normal"] = tabla["gastos_fijos"] + tabla["deudas"]
+    tabla["gastos_totales"] = tabla["gasto_normal"] + tabla["provisiones_usadas"] + tabla["ahorros_usados"]
+    tabla["saldo_real"] = tabla["ingresos"] - tabla["gastos_totales"] - tabla["provisiones_guardadas"] - tabla["ahorros_guardados"]
+
+    años = tabla.index.get_level_values("año").astype(str)
+    meses = tabla.index.get_level_values("mes").astype(str).str.zfill(2)
+    tabla["periodo"] = meses + "/" + años
+    return tabla
+
+
+def fila_mes(tabla, año, mes):
+    # Medidas de un mes; si no hay registros todas valen 0
+    try:
+        return tabla.loc[(año, mes)]
+    except KeyError:
+        fila = pd.Series(0, index=tabla.columns, dtype=object)
+        fila["con_ingresos"] = False
+        fila["periodo"] = f"{mes:02d}/{año}"
+        return fila
@@ -0,0 +1,59 @@
+# alertas.py
+import pandas as pd
+
+# === Reglas de alerta ===
+# Cada regla es una expresión vectorizada sobre la tabla de agregados mensuales
+# (una fila por (año, mes), ver agregados.py) que devuelve True en los meses
+# con problema. Todas se evalúan juntas sobre la historia completa, sin
+# recorrer meses ni volver a leer hojas. Si una regla nueva necesita un dato
+# por fila, se agrega como medida en agregados.MEDIDAS y sale del mismo
+# groupby que las demás.
+REGLAS = {
+    "provisiones_sin_monto": {
+        "nivel": "error",
+        "titulo": "Provisión usada sin monto",
+        "mensaje": "⚠️ Hay provisiones marcadas como 'Se usó = Sí' pero sin monto registrado.",
+        "condicion": lambda t: t["provisiones_usadas_sin_monto"] > 0,
+    },
+    "gasto_mayor_ingreso": {
+        "nivel": "error",
+        "titulo": "Gasto mayor al ingreso",
+        "mensaje": "🚨 Gastaste más de lo que ganaste este mes.",
+        "condicion": lambda t: t["ingresos"] < t["gastos_totales"],
+    },
+    "deudas_sin_cuotas": {
+        "nivel": "warning",
+        "titulo": "Deuda sin cuotas",
+        "mensaje": "🔔 Hay deudas sin cuotas registradas este mes.",
+        "condicion": lambda t: t["deudas_sin_cuotas"] > 0,
+    },
+    "provisiones_sin_fondo": {
+        "nivel": "warning",
+        "titulo": "Provisión en $0",
+        "mensaje": "💡 Hay provisiones con saldo cero. Podrías no tener cómo cubrir futuros gastos.",
+        "condicion": lambda t: t["provisiones_sin_fondo"] > 0,
+    },
+}
+
+
+def evaluar_alertas(agregados):
+    # Matriz mes × regla de booleanos (mismo índice (año, mes) que los agregados)
+    return pd.DataFrame(
+        {clave: regla["condicion"](agregados).astype(bool) for clave, regla in REGLAS.items()},
+        index=agregados.index,
+        columns=list(REGLAS),
+    )
+
+
+def alertas_del_mes(matriz, año, mes):
+    # Claves de las reglas que fallan en ese mes (ninguna si el mes no tiene datos)
+    try:
+        fila = matriz.loc[(año, mes)]
+    except KeyError:
+        return []
+    return [clave for clave in REGLAS if fila[clave]]
+
+
+def meses_con_problemas(matriz):
+    # Solo los meses con al menos una regla en falta, del más reciente al más antiguo
+    return matriz[matriz.any(axis=1)].sort_index(ascending=False)
@@ -0,0 +1,409 @@
+# almacenamiento.py
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from google_sheets import (
+    ARCHIVE_MANIFEST, apply_schema, archive_year, archived_years, delete_and_append_rows, is_read_only,
+    read_archived, read_sheet_as_df, read_sheets_as_dfs, refresh_known, tab_version, tab_writes,
+    write_df_to_sheet,
+)
+from periodos import reemplazar_meses, tabla_periodos
+
+# === Backends de almacenamiento ===
+# La app lee y guarda a través de un "almacén" con la misma interfaz para
+# ambos backends:
+#   leer(hoja) / leer_varias(hojas)            -> hoja(s) completa(s)
+#   leer_mes(hoja, año, mes) / leer_meses(...) -> solo las filas de ese mes
+#   guardar(hoja, df)                          -> reemplaza la hoja completa
+#   guardar_mes(hoja, año, mes, df)            -> reemplaza solo las filas del mes
+#   guardar_meses(hoja, {(año, mes): df})      -> varios meses en una sola escritura
+#   copiar_mes(ajustes, origen, destino)       -> "Ir a nuevo mes" en varias hojas, todo o nada
+#   años_archivados() / leer_archivo(hojas)    -> años cerrados guardados aparte y sus filas
+#   archivar_año(hojas, año)                   -> mueve un año cerrado al archivo
+#   version(hoja), version_archivo(), tabla(hoja, df), solo_lectura
+#   al_dia(hojas)                              -> versiones al día sin cargar las hojas
+#   escrituras(hoja)                           -> cuántas veces cambió version(hoja) por guardar
+# Las hojas sin columnas mes/año se leen completas también en leer_mes.
+# leer() y compañía devuelven solo los años sin archivar; leer_historial()
+# agrega los archivados para las vistas que los necesitan.
+PERIODO = ["año", "mes"]
+
+
+def _tiene_periodo(columnas):
+    return set(PERIODO) <= set(columnas)
+
+
+def filas_para_mes(df_mes, año, mes, ajustes):
+    # Filas de un mes copiadas a otro, con los valores de ajustes pisados
+    df = df_mes.copy()
+    df["mes"] = mes
+    df["año"] = año
+    for col, val in ajustes.items():
+        if col in df.columns:
+            df[col] = val
+    return df.reset_index(drop=True)
+
+
+class AlmacenSheets:
+    # Google Sheets directo (con el caché y la copia local de google_sheets).
+    # La API no filtra por mes: se lee la hoja y se toma el mes ya indexado.
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.id = ("sheets", sheet.id)
+
+    @property
+    def solo_lectura(self):
+        return is_read_only(self.sheet)
+
+    def version(self, hoja):
+        return tab_version(self.sheet, hoja)
+
+    def escrituras(self, hoja):
+        return tab_writes(self.sheet, hoja)
+
+    def tabla(self, hoja, df):
+        return tabla_periodos((self.sheet.id, hoja), self.version(hoja), df)
+
+    def leer(self, hoja):
+        return read_sheet_as_df(self.sheet, hoja)
+
+    def leer_varias(self, hojas):
+        return read_sheets_as_dfs(self.sheet, hojas)
+
+    def al_dia(self, hojas):
+        # Las versiones cambian al leer: con el caché vigente no cuesta nada
+        read_sheets_as_dfs(self.sheet, hojas)
+
+    def leer_mes(self, hoja, año, mes):
+        return self.tabla(hoja, self.leer(hoja)).mes(año, mes).copy()
+
+    def leer_meses(self, hojas, año, mes):
+        return {hoja: self.tabla(hoja, df).mes(año, mes).copy() for hoja, df in self.leer_varias(hojas).items()}
+
+    def guardar(self, hoja, df):
+        write_df_to_sheet(self.sheet, hoja, df, mode="diff")
+
+    def guardar_mes(self, hoja, año, mes, df_mes):
+        self.guardar_meses(hoja, {(año, mes): df_mes})
+
+    def guardar_meses(self, hoja, meses):
+        # Los meses se reemplazan sobre la hoja tal como está ahora en Google
+        # Sheets, sin pisar lo que se haya editado ahí directamente en otros meses
+        write_df_to_sheet(self.sheet, hoja, lambda actual: reemplazar_meses(actual, meses), mode="diff")
+
+    def copiar_mes(self, ajustes, origen, destino):
+        # ajustes: {hoja: {columna: valor}}; origen y destino: (año, mes).
+        # Solo se borran las filas que ya tuviera el mes destino y se agregan
+        # las copiadas, en un único batchUpdate para todas las hojas.
+        # Devuelve {hoja: filas copiadas}; una hoja sin filas en origen no se toca.
+        copiadas, cambios = {}, {}
+        # Las filas del mes destino se ubican sobre la hoja tal como está ahora
+        refresh_known(self.sheet, list(ajustes))
+        for hoja, df in self.leer_varias(list(ajustes)).items():
+            tabla = self.tabla(hoja, df)
+            df_mes = tabla.mes(*origen) if tabla.tiene_periodo else df.iloc[0:0]
+            copiadas[hoja] = len(df_mes)
+            if len(df_mes):
+                cambios[hoja] = (tabla.posiciones_mes(*destino), filas_para_mes(df_mes, *destino, ajustes[hoja]))
+        if cambios:
+            delete_and_append_rows(self.sheet, cambios)
+        return copiadas
+
+    def version_archivo(self):
+        return tab_version(self.sheet, ARCHIVE_MANIFEST)
+
+    def años_archivados(self):
+        return archived_years(self.sheet)
+
+    def leer_archivo(self, hojas):
+        return read_archived(self.sheet, hojas)
+
+    def archivar_año(self, hojas, año):
+        return archive_year(self.sheet, hojas, año)
+
+
+# === Backend SQLite ===
+# Una tabla por hoja con las mismas columnas, más _fila para conservar el orden,
+# e índice por (año, mes): las vistas de un mes leen solo esas filas y guardar
+# un mes es una transacción que borra e inserta únicamente las filas del mes.
+SQLITE_PATH = os.path.join(".datos", "finanzas.sqlite")
+
+
+def _q(nombre):
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _filas(df):
+    # Valores de Python; los nulos se guardan como NULL
+    return list(df.astype(object).where(pd.notna(df), None).itertuples(index=False, name=None))
+
+
+class AlmacenSQLite:
+    # Los cambios de estructura (CREATE/DROP/ALTER) van dentro de la misma
+    # transacción explícita que los datos, así un guardado es todo o nada.
+
+    def __init__(self, ruta=SQLITE_PATH):
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        self.id = ("sqlite", os.path.abspath(ruta))
+        self.solo_lectura = False
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS _hojas (hoja TEXT PRIMARY KEY, columnas TEXT NOT NULL, version INTEGER NOT NULL)"
+            )
+        self._hojas = {
+            hoja: {"columnas": json.loads(columnas), "version": version}
+            for hoja, columnas, version in self._conn.execute("SELECT hoja, columnas, version FROM _hojas")
+        }
+
+    def existe(self, hoja):
+        return hoja in self._hojas
+
+    def version(self, hoja):
+        entrada = self._hojas.get(hoja)
+        return entrada["version"] if entrada else 0
+
+    def escrituras(self, hoja):
+        # La versión solo cambia al guardar
+        return self.version(hoja)
+
+    def tabla(self, hoja, df):
+        return tabla_periodos((self.id, hoja), self.version(hoja), df)
+
+    # --- Lectura ---
+    def _consultar(self, hoja, año=None, mes=None):
+        entrada = self._hojas.get(hoja)
+        if entrada is None:
+            raise KeyError(f"La hoja '{hoja}' no existe en {self.ruta}")
+        columnas = entrada["columnas"]
+        if not columnas:
+            return pd.DataFrame()
+        lista = ", ".join(_q(c) for c in columnas)
+        if _tiene_periodo(columnas):
+            orden = ' ORDER BY "año", "mes", _fila'
+            if año is not None:
+                sql = f'SELECT {lista} FROM {_q(hoja)} WHERE "año" = ? AND "mes" = ?' + orden
+                parametros = (int(año), int(mes))
+            else:
+                sql, parametros = f"SELECT {lista} FROM {_q(hoja)}" + orden, ()
+        else:
+            sql, parametros = f"SELECT {lista} FROM {_q(hoja)} ORDER BY _fila", ()
+        with self._lock:
+            filas = self._conn.execute(sql, parametros).fetchall()
+        # Igual que en la planilla, una celda vacía se lee como ""
+        filas = [["" if v is None else v for v in fila] for fila in filas]
+        return apply_schema(hoja, pd.DataFrame(filas, columns=columnas))
+
+    def leer(self, hoja):
+        return self._consultar(hoja)
+
+    def leer_varias(self, hojas):
+        return {hoja: self._consultar(hoja) if hoja in self._hojas else pd.DataFrame() for hoja in hojas}
+
+    def al_dia(self, hojas):
+        # Las versiones se llevan al escribir: no hay nada que consultar
+        pass
+
+    def leer_mes(self, hoja, año, mes):
+        return self._consultar(hoja, año, mes)
+
+    def leer_meses(self, hojas, año, mes):
+        return {hoja: self._consultar(hoja, año, mes) if hoja in self._hojas else pd.DataFrame() for hoja in hojas}
+
+    # --- Escritura ---
+    def _preparar(self, hoja, columnas, reemplazar):
+        # Crea la tabla o agrega las columnas nuevas; devuelve el orden de columnas
+        columnas = [str(c) for c in columnas]
+        entrada = self._hojas.get(hoja)
+        if entrada is not None and reemplazar:
+            self._conn.execute(f"DROP TABLE {_q(hoja)}")
+            entrada = None
+        if entrada is None:
+            definicion = ", ".join(["_fila INTEGER PRIMARY KEY"] + [_q(c) for c in columnas])
+            self._conn.execute(f"CREATE TABLE {_q(hoja)} ({definicion})")
+            actuales = columnas
+        else:
+            actuales = list(entrada["columnas"])
+            for c in columnas:
+                if c not in actuales:
+                    self._conn.execute(f"ALTER TABLE {_q(hoja)} ADD COLUMN {_q(c)}")
+                    actuales.append(c)
+        if _tiene_periodo(actuales):
+            self._conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {_q("ix_" + hoja + "_periodo")} ON {_q(hoja)} ("año", "mes")'
+            )
+        return actuales
+
+    def _insertar(self, hoja, df):
+        if df.empty:
+            return
+        columnas = [str(c) for c in df.columns]
+        marcas = ", ".join("?" * len(columnas))
+        self._conn.executemany(
+            f"INSERT INTO {_q(hoja)} ({', '.join(_q(c) for c in columnas)}) VALUES ({marcas})",
+            _filas(df),
+        )
+
+    def _registrar(self, hoja, columnas):
+        version = self.version(hoja) + 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO _hojas (hoja, columnas, version) VALUES (?, ?, ?)",
+            (hoja, json.dumps(columnas, ensure_ascii=False), version),
+        )
+        return {"columnas": columnas, "version": version}
+
+    def guardar(self, hoja, df):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                columnas = self._preparar(hoja, df.columns, reemplazar=True)
+                self._insertar(hoja, df)
+                entrada = self._registrar(hoja, columnas)
+            self._hojas[hoja] = entrada
+
+    def guardar_mes(self, hoja, año, mes, df_mes):
+        self.guardar_meses(hoja, {(año, mes): df_mes})
+
+    def guardar_meses(self, hoja, meses):
+        self._guardar_meses({hoja: meses})
+
+    def _guardar_meses(self, por_hoja):
+        # {hoja: {(año, mes): df}} en una sola transacción: si algo falla,
+        # todas las hojas y meses quedan como estaban
+        por_hoja = {hoja: meses for hoja, meses in por_hoja.items() if meses}
+        if not por_hoja:
+            return
+        with self._lock:
+            anteriores = {hoja: self._hojas.get(hoja) for hoja in por_hoja}
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    for hoja, meses in por_hoja.items():
+                        for (año, mes), df_mes in meses.items():
+                            columnas = self._preparar(hoja, df_mes.columns, reemplazar=False)
+                            self._hojas[hoja] = {"columnas": columnas, "version": self.version(hoja)}
+                            if not _tiene_periodo(columnas):
+                                raise ValueError(f"La hoja '{hoja}' no tiene columnas mes/año")
+                            self._conn.execute(
+                                f'DELETE FROM {_q(hoja)} WHERE "año" = ? AND "mes" = ?', (int(año), int(mes))
+                            )
+                            self._insertar(hoja, df_mes)
+                        self._hojas[hoja] = self._registrar(hoja, columnas)
+            except Exception:
+                for hoja, anterior in anteriores.items():
+                    if anterior is None:
+                        self._hojas.pop(hoja, None)
+                    else:
+                        self._hojas[hoja] = anterior
+                raise
+
+    def copiar_mes(self, ajustes, origen, destino):
+        copiadas, por_hoja = {}, {}
+        for hoja, df_mes in self.leer_meses(list(ajustes), *origen).items():
+            if not _tiene_periodo(df_mes.columns):
+                df_mes = df_mes.iloc[0:0]
+            copiadas[hoja] = len(df_mes)
+            if len(df_mes):
+                por_hoja[hoja] = {destino: filas_para_mes(df_mes, *destino, ajustes[hoja])}
+        self._guardar_meses(por_hoja)
+        return copiadas
+
+    # --- Archivo ---
+    # La base filtra por (año, mes) con su índice, así que no hace falta
+    # separar años: todo queda en la misma tabla y no hay nada archivado.
+    def version_archivo(self):
+        return 0
+
+    def años_archivados(self):
+        return {}
+
+    def leer_archivo(self, hojas):
+        return {hoja: pd.DataFrame() for hoja in hojas}
+
+    def archivar_año(self, hojas, año):
+        raise RuntimeError("El archivo por año es solo para Google Sheets: en SQLite todos los años se leen por índice")
+
+
+# === Historial completo ===
+def leer_historial(almacen, hojas):
+    # Años archivados más los abiertos (con sus cambios sin escribir, si el
+    # almacén tiene cola). Solo para vistas que miran períodos antiguos.
+    actuales = almacen.leer_varias(hojas)
+    archivadas = almacen.leer_archivo(hojas)
+    historial = {}
+    for hoja in hojas:
+        df, archivo = actuales[hoja], archivadas.get(hoja, pd.DataFrame())
+        if len(archivo.columns) == 0:
+            historial[hoja] = df
+        elif len(df.columns) == 0:
+            historial[hoja] = archivo
+        else:
+            historial[hoja] = apply_schema(hoja, pd.concat([archivo, df], ignore_index=True))
+    return historial
+
+
+# === Sincronización ===
+# Con el backend SQLite, Google Sheets queda como destino: al conectar se
+# importan las hojas que aún no están en la base y, a pedido, se suben las
+# que cambiaron desde la última sincronización (escritura por diferencias).
+_sincronizadas = {}   # (id origen, id destino, hoja) -> versión subida
+
+
+def importar_faltantes(destino, origen, hojas):
+    faltantes = [hoja for hoja in hojas if not destino.existe(hoja)]
+    if faltantes:
+        for hoja, df in leer_historial(origen, faltantes).items():
+            if len(df.columns) == 0:
+                # No se pudo leer (o está vacía): se vuelve a intentar la próxima vez
+                continue
+            destino.guardar(hoja, df)
+            _sincronizadas[(destino.id, origen.id, hoja)] = destino.version(hoja)
+    return [hoja for hoja in faltantes if destino.existe(hoja)]
+
+
+def sincronizar(origen, destino, hojas):
+    # Sube a destino las hojas de origen con cambios; devuelve las que se subieron
+    destino.años_archivados()
+    if destino.solo_lectura:
+        # Sin el manifiesto no se sabe qué años están archivados en el destino
+        raise RuntimeError("Google Sheets no responde: se está usando la copia local, sincroniza más tarde")
+    subidas = []
+    for hoja in hojas:
+        clave = (origen.id, destino.id, hoja)
+        version = origen.version(hoja)
+        if _sincronizadas.get(clave) == version:
+            continue
+        df = origen.leer(hoja)
+        archivados = destino.años_archivados().get(hoja, [])
+        if archivados and "año" in df.columns:
+            # Lo que ya está en el archivo del destino no vuelve a la hoja abierta
+            df = df[~df["año"].isin(archivados)]
+        destino.guardar(hoja, df)
+        _sincronizadas[clave] = version
+        subidas.append(hoja)
+    return subidas
+
+
+_almacenes = {}       # ruta -> AlmacenSQLite (uno por proceso)
+_almacenes_lock = threading.Lock()
+
+
+def conectar_almacen(backend, sheet, ruta=SQLITE_PATH):
+    # backend: "sheets" (por defecto) o "sqlite"
+    if backend == "sheets":
+        return AlmacenSheets(sheet)
+    if backend != "sqlite":
+        raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+    with _almacenes_lock:
+        if ruta not in _almacenes:
+            _almacenes[ruta] = AlmacenSQLite(ruta)
+        return _almacenes[ruta]
@@ -1,13 +1,17 @@
 import streamlit as st
-import pandas as pd
-import datetime
-from google_sheets import connect_to_sheet, read_sheet_as_df, write_df_to_sheet
-import io
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+import os
+import time
+
+inicio_rerun = time.perf_counter()
 
 # === Banner ===
-st.image("banner_makaboom.png", use_container_width=True)
+# Se lee del disco una sola vez por proceso y después se sirve desde memoria
+@st.cache_resource
+def leer_banner():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "banner_makaboom.png"), "rb") as f:
+        return f.read()
+
+st.image(leer_banner(), use_container_width=True)
 
 # === Validación de acceso ===
 def validar_clave():
@@ -16,9 +20,6 @@ def validar_clave():
     else:
         st.error("PIN incorrecto.")
 
-def clp(monto):
-    return f"${int(monto):,}".replace(",", ".")
-
 
 if "acceso_autorizado" not in st.session_state:
     st.session_state.acceso_autorizado = False
@@ -27,9 +28,77 @@ if not st.session_state.acceso_autorizado:
     st.text_input("Ingresa tu PIN:", type="password", key="pin_clave", on_change=validar_clave)
     st.stop()
 
+# === Módulos de la app ===
+# Se importan después del PIN: tras reiniciar el servidor, la pantalla de
+# acceso aparece sin esperar a pandas, gspread y el resto de la app
+import pandas as pd
+import datetime
+from agregados import calcular_agregados_mensuales, fila_mes
+from alertas import REGLAS, alertas_del_mes, evaluar_alertas, meses_con_problemas
+from almacenamiento import SQLITE_PATH, AlmacenSheets, conectar_almacen, importar_faltantes, leer_historial, sincronizar
+from cola_escritura import con_cola
+import graficos
+from exportar import FORMATOS, MIME_XLSX, MIME_ZIP, LectorGenerador, exportar_excel, generar_rango
+from google_sheets import connect_to_sheet, enable_snapshot, invalidate_cache, retry_offline
+from libro_cuentas import MOVIMIENTOS, libro_de
+import metricas
+from periodos import TablaPeriodos, tabla_periodos
+from simulador import ESCENARIOS, simular, variabilidad
+from vistas import RegistroVistas, memoizar
+
+
+def clp(monto):
+    return f"${int(monto):,}".replace(",", ".")
+
+
 # === Conexión con Google Sheets ===
 SHEET_KEY = "1OPCAwKXoEHBmagpvkhntywqkAit7178pZv3ptXd9d9w"
+# Copia local en disco: arranque rápido y lectura sin conexión (se activa
+# antes de conectar: si la API no responde, la app arranca desde la copia)
+enable_snapshot()
 sheet = connect_to_sheet(st.secrets["credentials"], SHEET_KEY)
+retry_offline(sheet)
+aviso_conexion = st.empty()
+
+# Las hojas quedan en caché entre reruns; este botón fuerza releerlas
+# (por ejemplo, si se editó la planilla directamente en Google Sheets)
+if st.sidebar.button("🔄 Recargar datos desde Google Sheets"):
+    invalidate_cache(sheet)
+
+# === Almacenamiento ===
+# Por defecto se trabaja directo sobre Google Sheets. Con backend = "sqlite" en
+# la sección [storage] de los secrets, los datos viven en una base local indexada
+# por (año, mes) y Google Sheets queda como destino de sincronización.
+hojas = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros", "Reservas Familiares"]
+config_almacen = st.secrets.get("storage", {})
+almacen_base = conectar_almacen(config_almacen.get("backend", "sheets"), sheet, config_almacen.get("path", SQLITE_PATH))
+# Los guardados pasan por una cola: el botón responde de inmediato y la
+# escritura se hace en segundo plano
+almacen = con_cola(almacen_base)
+if almacen_base.id[0] == "sqlite":
+    planilla = AlmacenSheets(sheet)
+    importar_faltantes(almacen_base, planilla, hojas + ["Cuentas"])
+    if st.sidebar.button("⬆️ Sincronizar con Google Sheets"):
+        almacen.esperar()
+        try:
+            subidas = sincronizar(almacen_base, planilla, hojas + ["Cuentas"])
+        except Exception as e:
+            st.sidebar.error(f"No se pudo sincronizar: {e}")
+        else:
+            st.sidebar.success(f"Sincronizado: {', '.join(subidas)}" if subidas else "Google Sheets ya estaba al día.")
+
+# === Estado de los guardados ===
+def mostrar_estado_guardado():
+    estado = almacen.estado()
+    if estado["fallidos"]:
+        for hoja, error in estado["fallidos"].items():
+            st.error(f"❌ No se pudo guardar {hoja}: {error}")
+        st.button("🔁 Reintentar guardado", on_click=almacen.reintentar)
+    elif estado["pendientes"]:
+        st.info(f"⏳ Guardando: {', '.join(estado['pendientes'])}")
+    elif estado["ultimo_guardado"]:
+        hora = datetime.datetime.fromtimestamp(estado["ultimo_guardado"]).strftime("%H:%M:%S")
+        st.caption(f"✅ Todos los cambios guardados ({hora})")
 
 #Función obtener mes  y año siguiente
 def obtener_mes_siguiente(mes_actual, año_actual):
@@ -37,86 +106,195 @@ def obtener_mes_siguiente(mes_actual, año_actual):
         return 1, año_actual + 1
     else:
         return mes_actual + 1, año_actual
+
+# Hoja indexada por (año, mes); se reindexa solo cuando cambia su versión
+def obtener_tabla(hoja, df):
+    return almacen.tabla(hoja, df)
     
 
+# === Ir a nuevo mes ===
+# Copia el mes seleccionado al siguiente en las cinco hojas con un solo
+# batchUpdate: o se copian todas o no cambia ninguna. Corre como callback del
+# botón, antes de dibujar los selectores, para poder moverlos al mes nuevo.
+AJUSTES_NUEVO_MES = {
+    "Ingresos": {},
+    "Provisiones": {"se_usó": "No", "monto_usado": 0},
+    "Gastos Fijos": {"estado": "pendiente"},
+    "Ahorros": {},
+    "Reservas Familiares": {}
+}
+
+def ir_a_nuevo_mes():
+    mes_origen = st.session_state["mes_selector"]
+    año_origen = st.session_state["año_selector"]
+    nuevo_mes, nuevo_año = obtener_mes_siguiente(mes_origen, año_origen)
+    st.toast(f"Creando datos para {nuevo_mes}/{nuevo_año}...")
+
+    try:
+        with metricas.medir("operacion_segundos", operacion="ir_a_nuevo_mes"):
+            copiadas = almacen.copiar_mes(AJUSTES_NUEVO_MES, (año_origen, mes_origen), (nuevo_año, nuevo_mes))
+    except Exception as e:
+        st.toast(f"Error al crear {nuevo_mes}/{nuevo_año}: {e}. No se modificó ninguna hoja.")
+        return
+
+    for hoja, filas in copiadas.items():
+        if filas:
+            st.toast(f"{hoja} copiado correctamente.")
+        else:
+            st.toast(f"No hay datos en {hoja} para copiar.")
+    st.session_state["mes_selector"] = nuevo_mes
+    st.session_state["año_selector"] = nuevo_año
+
+
 # === Selección de mes y año ===
+AÑOS = list(range(2024, 2031))
 today = datetime.date.today()
+# Valores iniciales en session_state (no con index=) porque ir_a_nuevo_mes los cambia
+st.session_state.setdefault("mes_selector", today.month)
+st.session_state.setdefault("año_selector", AÑOS[1])
 col1, col2, col3 = st.columns(3)
 with col1:
-    mes = st.selectbox("Mes", list(range(1, 13)), index=today.month - 1, key="mes_selector")
+    mes = st.selectbox("Mes", list(range(1, 13)), key="mes_selector")
 with col2:
-    año = st.selectbox("Año", list(range(2024, 2031)), index=1, key="año_selector")
+    año = st.selectbox("Año", AÑOS, key="año_selector")
 with col3:
     st.markdown("<br>", unsafe_allow_html=True)  # Esto empuja el botón hacia abajo
-    if st.button("➡️ Ir a nuevo mes", help="Duplicar datos al mes siguiente"):
-        nuevo_mes, nuevo_año = obtener_mes_siguiente(mes, año)
-        st.toast(f"Creando datos para {nuevo_mes}/{nuevo_año}...")
-
-        hojas = {
-            "Ingresos": {},
-            "Provisiones": {"se_usó": "No", "monto_usado": 0},
-            "Gastos Fijos": {"estado": "pendiente"},
-            "Ahorros": {},
-            "Reservas Familiares": {}
-        }
-
-        for hoja, ajustes in hojas.items():
-            try:
-                df = read_sheet_as_df(sheet, hoja)
-                df_origen = df[(df["mes"] == mes) & (df["año"] == año)].copy()
-                if df_origen.empty:
-                    st.toast(f"No hay datos en {hoja} para copiar.")
-                    continue
-
-                df_origen["mes"] = nuevo_mes
-                df_origen["año"] = nuevo_año
-
-                for col, val in ajustes.items():
-                    if col in df_origen.columns:
-                        df_origen[col] = val
-
-                df_sin_nuevo = df[~((df["mes"] == nuevo_mes) & (df["año"] == nuevo_año))]
-                df_final = pd.concat([df_sin_nuevo, df_origen], ignore_index=True)
-                write_df_to_sheet(sheet, hoja, df_final)
-                st.toast(f"{hoja} copiado correctamente.")
-            except Exception as e:
-                st.toast(f"Error al copiar {hoja}: {e}")
-        st.session_state["mes_selector"] = nuevo_mes
-        st.session_state["año_selector"] = nuevo_año
+    st.button("➡️ Ir a nuevo mes", help="Duplicar datos al mes siguiente", on_click=ir_a_nuevo_mes, disabled=almacen.solo_lectura)
 
 # === Lectura centralizada de hojas ===
-hojas = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros", "Reservas Familiares"]
-df_hojas = {}
-for hoja in hojas:
-    try:
-        df_hojas[hoja] = read_sheet_as_df(sheet, hoja)
-    except:
-        df_hojas[hoja] = pd.DataFrame()
-
-# === Leer cuentas ===
-try:
-    df_cuentas = read_sheet_as_df(sheet, "Cuentas")
-    lista_cuentas = df_cuentas["nombre_cuenta"].dropna().unique().tolist()
-except:
-    lista_cuentas = []
+HOJAS_AGREGADOS = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros"]
+
+def cargar_hojas(nombres):
+    # Cada vista pide solo las hojas que usa; vienen del caché si están vigentes
+    # y las que falten se traen juntas en un solo batchGet
+    return almacen.leer_varias(nombres)
+
+def versiones(nombres):
+    # Para las claves de memoria: las versiones solo cambian al leer, así que
+    # primero se traen al día las hojas vencidas (o recargadas)
+    almacen.al_dia(nombres)
+    return tuple(almacen.version(hoja) for hoja in nombres)
+
+# === Años archivados ===
+# Los años cerrados pueden estar en pestañas de archivo. Solo las vistas que
+# miran períodos antiguos (Evolución, Ingresos vs Gastos, alertas,
+# exportaciones, saldos acumulados) o un mes de un año archivado los cargan;
+# el resto trabaja con los años abiertos.
+def version_historial(hoja):
+    # La hoja completa cambia con su parte abierta o al archivar un año
+    return (almacen.version(hoja), almacen.version_archivo())
+
+def versiones_historial(nombres):
+    almacen.al_dia(nombres)
+    return tuple(version_historial(hoja) for hoja in nombres)
+
+def año_archivado(a):
+    # Solo se archivan años cerrados: el año en curso no necesita el manifiesto
+    if a >= datetime.date.today().year:
+        return False
+    return any(a in años for años in almacen.años_archivados().values())
+
+def cargar_historial(nombres):
+    # Sin nada archivado es lo mismo que cargar_hojas
+    if not almacen.años_archivados():
+        return cargar_hojas(nombres)
+    clave = ("historial", almacen.id, tuple(nombres), versiones_historial(nombres))
+    return memoizar(clave, lambda: leer_historial(almacen, nombres))
+
+def obtener_tablas(nombres, con_archivo=False):
+    if not con_archivo or not almacen.años_archivados():
+        return {hoja: obtener_tabla(hoja, df) for hoja, df in cargar_hojas(nombres).items()}
+    return {
+        hoja: tabla_periodos((almacen.id, hoja, "historial"), version_historial(hoja), df)
+        for hoja, df in cargar_historial(nombres).items()
+    }
+
+# === Tabla mensual compartida por todas las pestañas ===
+def medido(calculo, fn):
+    # Envuelve un cálculo memorizado: el tiempo se registra solo cuando de verdad se calcula
+    def calcular():
+        with metricas.medir("calculo_segundos", calculo=calculo):
+            return fn()
+    return calcular
+
+def obtener_agregados(con_archivo=False):
+    # Se recalcula solo cuando cambia alguna de las hojas que la componen.
+    # con_archivo=True incluye también los años archivados. La clave solo
+    # necesita las versiones: las hojas se cargan únicamente si hay que calcular.
+    historial = con_archivo and bool(almacen.años_archivados())
+    if historial:
+        clave = ("agregados_historial", almacen.id, versiones_historial(HOJAS_AGREGADOS))
+    else:
+        clave = ("agregados", almacen.id, versiones(HOJAS_AGREGADOS))
+
+    def calcular():
+        df_hojas = cargar_historial(HOJAS_AGREGADOS) if historial else cargar_hojas(HOJAS_AGREGADOS)
+        with metricas.medir("calculo_segundos", calculo="agregados"):
+            return calcular_agregados_mensuales(df_hojas)
+    return memoizar(clave, calcular)
+
+def obtener_alertas():
+    # Matriz mes × regla evaluada de una vez sobre la tabla mensual (con los años archivados)
+    clave = ("alertas", almacen.id, versiones_historial(HOJAS_AGREGADOS))
+    return memoizar(clave, medido("alertas", lambda: evaluar_alertas(obtener_agregados(con_archivo=True))))
+
+def obtener_variabilidad():
+    # Variación histórica de cada categoría, para la proyección del simulador
+    clave = ("variabilidad", almacen.id, versiones(HOJAS_AGREGADOS))
+    return memoizar(clave, medido("variabilidad", lambda: variabilidad(obtener_agregados())))
+
+def obtener_libro():
+    # Libro de cuentas: solo se vuelven a leer y agrupar las hojas que cambiaron.
+    # Los saldos se acumulan desde el primer mes, con los años archivados.
+    libro = libro_de(almacen.id)
+    almacen.al_dia(list(MOVIMIENTOS))
+    with metricas.medir("calculo_segundos", calculo="libro_cuentas"):
+        libro.actualizar(version_historial, cargar_historial)
+    return libro
+
+def obtener_mes_actual():
+    # Resumen, Distribución y Simulador solo miran el mes seleccionado:
+    # se leen únicamente sus filas y se agregan
+    if año_archivado(año):
+        # Año archivado: el mes sale de la tabla mensual con el historial
+        return fila_mes(obtener_agregados(con_archivo=True), año, mes)
+    clave = ("agregados_mes", almacen.id, versiones(HOJAS_AGREGADOS), año, mes)
+    return memoizar(clave, medido("agregados_mes", lambda: fila_mes(
+        calcular_agregados_mensuales(almacen.leer_meses(HOJAS_AGREGADOS, año, mes)), año, mes
+    )))
 
 # === Función para mostrar y guardar editor ===
-def mostrar_editor(nombre_hoja, columnas_dropdown=None):
+def mostrar_editor(nombre_hoja, lista_cuentas, columnas_dropdown=None):
     try:
-        df = read_sheet_as_df(sheet, nombre_hoja)
+        archivado = año in almacen.años_archivados().get(nombre_hoja, [])
+        if archivado:
+            df_archivo = almacen.leer_archivo([nombre_hoja])[nombre_hoja]
+        else:
+            df_filtrado = almacen.leer_mes(nombre_hoja, año, mes)
     except:
         st.warning(f"No se pudo cargar la hoja '{nombre_hoja}'")
         return
 
-    tiene_mes_anio = "mes" in df.columns and "año" in df.columns
-    df_filtrado = df[(df["mes"] == mes) & (df["año"] == año)] if tiene_mes_anio else df.copy()
+    if archivado:
+        # Año cerrado: se consulta desde su pestaña de archivo, sin editar
+        st.subheader(f"{nombre_hoja} ({mes}/{año})")
+        st.info(f"🗄️ {año} está archivado en la pestaña '{nombre_hoja} {año}': sus meses se pueden ver pero no editar.")
+        df_mes = TablaPeriodos(df_archivo).mes(año, mes) if len(df_archivo.columns) else df_archivo
+        st.dataframe(df_mes.drop(columns=["mes", "año"], errors="ignore"), use_container_width=True, hide_index=True)
+        return
+
+    tiene_mes_anio = "mes" in df_filtrado.columns and "año" in df_filtrado.columns
     st.subheader(f"{nombre_hoja} ({mes}/{año})" if tiene_mes_anio else nombre_hoja)
 
     columnas_ocultas = ["mes", "año"]
     columnas_visibles = [c for c in df_filtrado.columns if c not in columnas_ocultas]
 
+    # Las categorías se editan como texto libre para poder ingresar valores nuevos
+    df_editable = df_filtrado[columnas_visibles]
+    df_editable = df_editable.astype({c: object for c in df_editable.select_dtypes("category").columns})
+
     edited_df = st.data_editor(
-        df_filtrado[columnas_visibles],
+        df_editable,
         num_rows="dynamic",
         use_container_width=True,
         hide_index=True,
@@ -126,55 +304,40 @@ def mostrar_editor(nombre_hoja, columnas_dropdown=None):
         }
     )
 
-    if st.button(f"💾 Guardar cambios en {nombre_hoja}", key=f"save_{nombre_hoja}"):
+    if st.button(f"💾 Guardar cambios en {nombre_hoja}", key=f"save_{nombre_hoja}", disabled=almacen.solo_lectura):
         if tiene_mes_anio:
             edited_df["mes"] = mes
             edited_df["año"] = año
-            df_sin_filtro = df[~((df["mes"] == mes) & (df["año"] == año))]
-            df_final = pd.concat([df_sin_filtro, edited_df], ignore_index=True)
+            version_anterior = version_historial(nombre_hoja)
+            almacen.guardar_mes(nombre_hoja, año, mes, edited_df)
+            # El libro de cuentas se actualiza solo en este mes
+            libro_de(almacen.id).actualizar_mes(
+                nombre_hoja, año, mes, edited_df, version_anterior, version_historial(nombre_hoja)
+            )
         else:
-            df_final = edited_df
-        write_df_to_sheet(sheet, nombre_hoja, df_final)
+            almacen.guardar(nombre_hoja, edited_df)
         st.success(f"{nombre_hoja} actualizado correctamente.")
 
-# === Tabs para mostrar categorías dentro de "Datos Detallados" ===
-main_tabs = st.tabs(["📊 Resumen General",
-                    "🔔 Alertas",
-                    "📋 Datos Detallados",
-                    "📈 Reportes y Análisis",
-                    "🧮 Simulador"])
+# === Secciones principales ===
+# Cada sección es una vista registrada: solo corre la seleccionada
+vistas_principales = RegistroVistas("vista_principal")
+vistas_reportes = RegistroVistas("vista_reportes")
 
 
-with main_tabs[0]:
+@vistas_principales.vista("📊 Resumen General")
+def vista_resumen():
     st.subheader("📊 Resumen General")
     #=== RESUMEN GRAL
     try:
-        # === Leer hojas ===
-        df_ing = read_sheet_as_df(sheet, "Ingresos")
-        df_gastos = read_sheet_as_df(sheet, "Gastos Fijos")
-        df_deudas = read_sheet_as_df(sheet, "Deudas")
-        df_provisiones = read_sheet_as_df(sheet, "Provisiones")
-        df_ahorros = read_sheet_as_df(sheet, "Ahorros")
-
-        # === Filtros por mes y año ===
-        ing_mes = df_ing[(df_ing["mes"] == mes) & (df_ing["año"] == año)]
-        gf_pagados = df_gastos[(df_gastos["mes"] == mes) & (df_gastos["año"] == año) & (df_gastos["estado"].str.lower() == "pagado")]
-        deudas_mes = df_deudas[(df_deudas["mes"] == mes) & (df_deudas["año"] == año)]
-        provisiones_mes = df_provisiones[(df_provisiones["mes"] == mes) & (df_provisiones["año"] == año)]
-        ahorros_mes = df_ahorros[(df_ahorros["mes"] == mes) & (df_ahorros["año"] == año)]
+        fila = obtener_mes_actual()
 
         # === Cálculos ===
-        total_ingresos = ing_mes["monto"].sum()
-        gasto_deudas = (deudas_mes["monto_cuota"] * deudas_mes["cuotas_mes"]).sum()
-        gasto_normal = gf_pagados["monto"].sum() + gasto_deudas
-        gasto_provisiones = provisiones_mes["monto_usado"].sum()
-        gasto_ahorros = ahorros_mes["monto_retirado"].sum()
-        gasto_total = gasto_normal + gasto_provisiones + gasto_ahorros
-
-        provisiones_guardadas = provisiones_mes["monto"].sum()
-        ahorros_guardados = ahorros_mes["monto_ingreso"].sum()
-
-        saldo_real = total_ingresos - gasto_total - provisiones_guardadas - ahorros_guardados
+        total_ingresos = fila["ingresos"]
+        gasto_normal = fila["gasto_normal"]
+        gasto_provisiones = fila["provisiones_usadas"]
+        gasto_ahorros = fila["ahorros_usados"]
+        gasto_total = fila["gastos_totales"]
+        saldo_real = fila["saldo_real"]
 
         # === Mostrar métricas ===
         col1, col2, col3 = st.columns(3)
@@ -209,63 +372,102 @@ with main_tabs[0]:
         st.warning("No se pudo calcular el resumen financiero.")
         st.text(f"Error: {e}")
     
-with main_tabs[1]:
+@vistas_principales.vista("🔔 Alertas")
+def vista_alertas():
     st.subheader("🔔 Alertas")
 
     try:
-        df_ing = read_sheet_as_df(sheet, "Ingresos")
-        df_gastos = read_sheet_as_df(sheet, "Gastos Fijos")
-        df_deudas = read_sheet_as_df(sheet, "Deudas")
-        df_provisiones = read_sheet_as_df(sheet, "Provisiones")
-        df_ahorros = read_sheet_as_df(sheet, "Ahorros")
-
-        # === Filtrar por mes y año
-        ing_mes = df_ing[(df_ing["mes"] == mes) & (df_ing["año"] == año)]
-        gastos_pagados = df_gastos[(df_gastos["mes"] == mes) & (df_gastos["año"] == año) & (df_gastos["estado"].str.lower() == "pagado")]
-        deudas_mes = df_deudas[(df_deudas["mes"] == mes) & (df_deudas["año"] == año)]
-        provisiones_mes = df_provisiones[(df_provisiones["mes"] == mes) & (df_provisiones["año"] == año)]
-        ahorros_mes = df_ahorros[(df_ahorros["mes"] == mes) & (df_ahorros["año"] == año)]
-
-        alerta_mostrada = False
-
-        # 1. Provisiones "se usó" = Sí, pero monto usado = 0
-        usadas_cero = provisiones_mes[(provisiones_mes["se_uso"].str.lower() == "si") & (provisiones_mes["monto_usado"] == 0)]
-        if not usadas_cero.empty:
-            st.error("⚠️ Hay provisiones marcadas como 'Se usó = Sí' pero sin monto registrado.")
-            alerta_mostrada = True
-
-        # 2. Ingresos < Gasto total
-        ingreso_total = ing_mes["monto"].sum()
-        gasto_normal = gastos_pagados["monto"].sum() + (deudas_mes["monto_cuota"] * deudas_mes["cuotas_mes"]).sum()
-        gasto_provisiones = provisiones_mes["monto_usado"].sum()
-        gasto_ahorros = ahorros_mes["monto_retirado"].sum()
-        gasto_total = gasto_normal + gasto_provisiones + gasto_ahorros
-
-        if ingreso_total < gasto_total:
-            st.error("🚨 Gastaste más de lo que ganaste este mes.")
-            alerta_mostrada = True
-
-        # 3. Deudas con cuotas_mes = 0
-        deudas_no_pagadas = deudas_mes[deudas_mes["cuotas_mes"] == 0]
-        if not deudas_no_pagadas.empty:
-            st.warning("🔔 Hay deudas sin cuotas registradas este mes.")
-            alerta_mostrada = True
-
-        # 4. Provisiones sin saldo (monto = 0)
-        provisiones_sin_fondo = provisiones_mes[provisiones_mes["monto"] == 0]
-        if not provisiones_sin_fondo.empty:
-            st.warning("💡 Hay provisiones con saldo cero. Podrías no tener cómo cubrir futuros gastos.")
-            alerta_mostrada = True
-
-        if not alerta_mostrada:
+        matriz = obtener_alertas()
+
+        # === Mes seleccionado ===
+        claves = alertas_del_mes(matriz, año, mes)
+        for clave in claves:
+            regla = REGLAS[clave]
+            (st.error if regla["nivel"] == "error" else st.warning)(regla["mensaje"])
+
+        if not claves:
             st.success("✨ Todo en orden este mes. ¡Buen trabajo!")
 
+        # === Meses con problemas (toda la historia) ===
+        st.markdown("### 📆 Meses con problemas")
+        problemas = meses_con_problemas(matriz)
+        if problemas.empty:
+            st.info("Ningún mes registrado tiene alertas.")
+        else:
+            tabla = problemas.replace({True: "⚠️", False: ""})
+            tabla.index = obtener_agregados(con_archivo=True).loc[problemas.index, "periodo"]
+            tabla.index.name = "Mes"
+            tabla.columns = [REGLAS[clave]["titulo"] for clave in tabla.columns]
+            st.caption(f"{len(problemas)} de {len(matriz)} meses con al menos una alerta.")
+            st.dataframe(tabla, use_container_width=True)
+
     except Exception as e:
         st.warning("No se pudieron evaluar las alertas.")
         st.text(f"Error: {e}")
 
 
-with main_tabs[2]:
+@vistas_principales.vista("🏦 Saldos por Cuenta")
+def vista_saldos_cuentas():
+    st.subheader(f"🏦 Saldos por Cuenta al cierre de {mes:02d}/{año}")
+
+    try:
+        libro = obtener_libro()
+        try:
+            cuentas = cargar_hojas(["Cuentas"])["Cuentas"]["nombre_cuenta"].dropna().unique().tolist()
+        except Exception:
+            cuentas = []
+        saldos = libro.saldos_al(año, mes, cuentas)
+
+        if saldos.empty:
+            st.info("Aún no hay movimientos con cuenta asignada.")
+            return
+
+        col1, col2 = st.columns(2)
+        col1.metric("💼 Saldo total en cuentas", clp(saldos["saldo"].sum()))
+        col2.metric("🔄 Movimiento neto del mes", clp(saldos["movimiento_mes"].sum()))
+
+        st.dataframe(pd.DataFrame({
+            "Cuenta": saldos.index,
+            "Movimiento del mes": saldos["movimiento_mes"].map(clp).to_numpy(),
+            "Saldo": saldos["saldo"].map(clp).to_numpy(),
+        }), use_container_width=True, hide_index=True)
+        st.caption(
+            "Entra a la cuenta lo registrado en Ingresos, Ahorros (ingresos menos retiros) y "
+            "Reservas Familiares; sale lo pagado en Gastos Fijos desde su cuenta de pago."
+        )
+
+        # === Historial de una cuenta ===
+        cuenta = st.selectbox("📒 Ver historial de la cuenta", saldos.index.tolist(), key="cuenta_historial")
+        historial = libro.saldos()
+        if cuenta in historial.index.get_level_values("cuenta"):
+            historial = historial.xs(cuenta, level="cuenta")
+            st.dataframe(pd.DataFrame({
+                "Mes": [f"{m:02d}/{a}" for a, m in historial.index],
+                **{hoja: historial[hoja].map(clp).to_numpy() for hoja in MOVIMIENTOS},
+                "Movimiento": historial["movimiento"].map(clp).to_numpy(),
+                "Saldo": historial["saldo"].map(clp).to_numpy(),
+            }), use_container_width=True, hide_index=True)
+        else:
+            st.info("Esta cuenta todavía no tiene movimientos.")
+
+    except Exception as e:
+        st.warning("No se pudieron calcular los saldos por cuenta.")
+        st.text(f"Error: {e}")
+
+
+@vistas_principales.vista("📋 Datos Detallados")
+def vista_datos():
+    # Con Sheets, todas las hojas del editor (más Cuentas) quedan en caché con un
+    # solo batchGet; SQLite lee cada mes por índice y aquí solo necesita Cuentas
+    precarga = ["Cuentas"] if almacen_base.id[0] == "sqlite" else hojas + ["Cuentas"]
+    df_cuentas = cargar_hojas(precarga)["Cuentas"]
+
+    # === Leer cuentas ===
+    try:
+        lista_cuentas = df_cuentas["nombre_cuenta"].dropna().unique().tolist()
+    except:
+        lista_cuentas = []
+
     # === Tabs principales reorganizados ===
     sub_tabs = st.tabs([
         "📥 Ingresos", 
@@ -277,263 +479,203 @@ with main_tabs[2]:
         "⚙️ Configuración"
     ])
 
-    with sub_tabs[0]: mostrar_editor("Ingresos", columnas_dropdown=["cuenta"])
-    with sub_tabs[1]: mostrar_editor("Provisiones")
-    with sub_tabs[2]: mostrar_editor("Gastos Fijos", columnas_dropdown=["cuenta_pago"])
-    with sub_tabs[3]: mostrar_editor("Ahorros", columnas_dropdown=["cuenta"])
-    with sub_tabs[4]: mostrar_editor("Reservas Familiares", columnas_dropdown=["cuenta"])
-    with sub_tabs[5]: mostrar_editor("Deudas")
+    with sub_tabs[0]: mostrar_editor("Ingresos", lista_cuentas, columnas_dropdown=["cuenta"])
+    with sub_tabs[1]: mostrar_editor("Provisiones", lista_cuentas)
+    with sub_tabs[2]: mostrar_editor("Gastos Fijos", lista_cuentas, columnas_dropdown=["cuenta_pago"])
+    with sub_tabs[3]: mostrar_editor("Ahorros", lista_cuentas, columnas_dropdown=["cuenta"])
+    with sub_tabs[4]: mostrar_editor("Reservas Familiares", lista_cuentas, columnas_dropdown=["cuenta"])
+    with sub_tabs[5]: mostrar_editor("Deudas", lista_cuentas)
 
     with sub_tabs[6]:
         st.subheader("🏦 Cuentas")
         try:
-            df_cuentas = read_sheet_as_df(sheet, "Cuentas")
+            df_cuentas = almacen.leer("Cuentas")
         except:
             st.warning("No se pudo cargar la hoja 'Cuentas'")
             df_cuentas = pd.DataFrame(columns=["nombre_cuenta", "banco", "tipo"])
 
         edited_cuentas = st.data_editor(
-            df_cuentas,
+            df_cuentas.astype({c: object for c in df_cuentas.select_dtypes("category").columns}),
             num_rows="dynamic",
             use_container_width=True,
             hide_index=True
         )
 
-        if st.button("💾 Guardar cambios en Cuentas"):
+        if st.button("💾 Guardar cambios en Cuentas", disabled=almacen.solo_lectura):
             if edited_cuentas["nombre_cuenta"].isnull().any() or edited_cuentas["nombre_cuenta"].duplicated().any():
                 st.error("No se permiten nombres vacíos ni duplicados.")
             else:
-                write_df_to_sheet(sheet, "Cuentas", edited_cuentas)
+                almacen.guardar("Cuentas", edited_cuentas)
                 st.success("Cuentas actualizadas correctamente.")
 
+        # === Archivo por año ===
+        # Mover los años cerrados a sus propias pestañas deja las hojas del día
+        # a día solo con los años abiertos
+        st.subheader("🗄️ Archivo por año")
+        if almacen_base.id[0] == "sqlite":
+            st.caption("Con la base SQLite no hace falta archivar: cada mes se lee por índice.")
+        else:
+            archivados = almacen.años_archivados()
+            if archivados:
+                for hoja_archivada, años_archivados in archivados.items():
+                    st.caption(f"{hoja_archivada}: {', '.join(str(a) for a in años_archivados)}")
+            else:
+                st.caption("Todavía no hay años archivados.")
+
+            años_abiertos = sorted({
+                int(a) for df in cargar_hojas(hojas).values() if "año" in df.columns
+                for a in pd.to_numeric(df["año"], errors="coerce").dropna().unique()
+            })
+            cerrados = [a for a in años_abiertos if a < datetime.date.today().year]
+            if not cerrados:
+                st.info("No hay años cerrados para archivar.")
+            else:
+                año_archivar = st.selectbox("Año a archivar", cerrados, key="año_archivar")
+                if st.button(f"🗄️ Archivar {año_archivar}", disabled=almacen.solo_lectura):
+                    try:
+                        movidas = almacen.archivar_año(hojas, año_archivar)
+                        detalle = ", ".join(f"{hoja} ({n} filas)" for hoja, n in movidas.items())
+                        st.success(f"{año_archivar} archivado: {detalle}." if movidas else f"No había filas de {año_archivar}.")
+                    except Exception as e:
+                        st.error(f"No se pudo archivar {año_archivar}: {e}")
+
     
-with main_tabs[3]:
+@vistas_principales.vista("📈 Reportes y Análisis")
+def vista_reportes():
     st.subheader("📈 Reportes y Análisis")   
-    
-    rep_tabs = st.tabs([
-        "💰 Ingresos vs Gastos",
-        "📊 Distribución por Categoría",
-        "📆 Evolución Mensual",
-        "📤 Exportar Resumen"
-    ])
-
-    with rep_tabs[0]:
-        st.markdown("💰 Ingresos vs Gastos Mensuales")
-
-        try:
-            df_ing = read_sheet_as_df(sheet, "Ingresos")
-            df_gas = read_sheet_as_df(sheet, "Gastos Fijos")
-            df_deu = read_sheet_as_df(sheet, "Deudas")
-            df_pro = read_sheet_as_df(sheet, "Provisiones")
-            df_aho = read_sheet_as_df(sheet, "Ahorros")
-
-            # Agrupar ingresos
-            df_ingresos = df_ing.groupby(["año", "mes"])["monto"].sum().reset_index(name="ingresos")
-
-            # Gastos fijos pagados
-            df_gas_pag = df_gas[df_gas["estado"].str.lower() == "pagado"]
-            df_gastos_fijos = df_gas_pag.groupby(["año", "mes"])["monto"].sum().reset_index(name="gastos_fijos")
-
-            # Deudas = monto_cuota * cuotas_mes
-            df_deu["gasto_deuda"] = df_deu["monto_cuota"] * df_deu["cuotas_mes"]
-            df_gastos_deuda = df_deu.groupby(["año", "mes"])["gasto_deuda"].sum().reset_index(name="deudas")
-
-            # Provisiones usadas
-            df_gastos_prov = df_pro.groupby(["año", "mes"])["monto_usado"].sum().reset_index(name="provisiones_usadas")
-
-            # Ahorros retirados
-            df_gastos_aho = df_aho.groupby(["año", "mes"])["monto_retirado"].sum().reset_index(name="ahorros_usados")
+    vistas_reportes.mostrar()
 
-            # Combinar todo
-            df_merge = df_ingresos \
-                .merge(df_gastos_fijos, on=["año", "mes"], how="left") \
-                .merge(df_gastos_deuda, on=["año", "mes"], how="left") \
-                .merge(df_gastos_prov, on=["año", "mes"], how="left") \
-                .merge(df_gastos_aho, on=["año", "mes"], how="left")
+@vistas_reportes.vista("💰 Ingresos vs Gastos")
+def vista_ingresos_vs_gastos():
+    st.markdown("💰 Ingresos vs Gastos Mensuales")
 
-            # Reemplazar nulos por 0
-            df_merge.fillna(0, inplace=True)
-
-            df_merge["gastos_totales"] = df_merge["gastos_fijos"] + df_merge["deudas"] + df_merge["provisiones_usadas"] + df_merge["ahorros_usados"]
-            df_merge["periodo"] = df_merge["mes"].astype(str).str.zfill(2) + "/" + df_merge["año"].astype(str)
-
-            # === Gráfico en modo oscuro ===
-            import matplotlib.pyplot as plt
+    try:
+        # Solo los meses con ingresos registrados
+        agregados = obtener_agregados(con_archivo=True)
+        df_merge = agregados[agregados["con_ingresos"]]
 
-            plt.style.use("dark_background")
-            fig, ax = plt.subplots()
-            ax.bar(df_merge["periodo"], df_merge["ingresos"], label="Ingresos", color="#4CAF50")
-            ax.bar(df_merge["periodo"], df_merge["gastos_totales"], label="Gastos", color="#F44336", alpha=0.7)
-            ax.set_title("Ingresos vs Gastos Totales por Mes")
-            ax.set_ylabel("CLP")
-            ax.legend()
-            ax.tick_params(axis='x', rotation=45)
+        # === Gráfico en modo oscuro ===
+        png = graficos.barras_ingresos_vs_gastos(df_merge["periodo"], df_merge["ingresos"], df_merge["gastos_totales"])
+        st.image(png, use_container_width=True)
 
-            st.pyplot(fig)
+    except Exception as e:
+        st.error("No se pudo generar el gráfico de ingresos vs gastos.")
+        st.text(f"Error: {e}")
 
-        except Exception as e:
-            st.error("No se pudo generar el gráfico de ingresos vs gastos.")
-            st.text(f"Error: {e}")
+@vistas_reportes.vista("📊 Distribución por Categoría")
+def vista_distribucion():
+    st.markdown("📊 Distribución del Gasto por Origen (Mes Actual)")
+    try:
+        fila = obtener_mes_actual()
+        gasto_normal = fila["gasto_normal"]
+        gasto_provisiones = fila["provisiones_usadas"]
+        gasto_ahorros = fila["ahorros_usados"]
+
+        # Preparar gráfico
+        labels = ["Desde Ingresos Normales", "Desde Provisiones", "Desde Ahorros"]
+        valores = [gasto_normal, gasto_provisiones, gasto_ahorros]
+
+        # Si no hay gasto, no mostrar gráfico
+        if sum(valores) == 0:
+            st.info("No se han registrado gastos este mes.")
+        else:
+            png = graficos.torta(valores, labels, "Distribución del Gasto por Origen")
+            st.image(png, use_container_width=True)
 
-    with rep_tabs[1]:
-        st.markdown("📊 Distribución del Gasto por Origen (Mes Actual)")
-        try:
-            # Volvemos a leer hojas por si se entra directamente
-            df_gas = read_sheet_as_df(sheet, "Gastos Fijos")
-            df_deu = read_sheet_as_df(sheet, "Deudas")
-            df_pro = read_sheet_as_df(sheet, "Provisiones")
-            df_aho = read_sheet_as_df(sheet, "Ahorros")
-
-            # Filtro por mes/año
-            gastos_pagados = df_gas[(df_gas["mes"] == mes) & (df_gas["año"] == año) & (df_gas["estado"].str.lower() == "pagado")]
-            deudas_mes = df_deu[(df_deu["mes"] == mes) & (df_deu["año"] == año)]
-            provisiones_mes = df_pro[(df_pro["mes"] == mes) & (df_pro["año"] == año)]
-            ahorros_mes = df_aho[(df_aho["mes"] == mes) & (df_aho["año"] == año)]
-
-            # Cálculos
-            gasto_normal = gastos_pagados["monto"].sum() + (deudas_mes["monto_cuota"] * deudas_mes["cuotas_mes"]).sum()
-            gasto_provisiones = provisiones_mes["monto_usado"].sum()
-            gasto_ahorros = ahorros_mes["monto_retirado"].sum()
-
-            # Preparar gráfico
-            labels = ["Desde Ingresos Normales", "Desde Provisiones", "Desde Ahorros"]
-            valores = [gasto_normal, gasto_provisiones, gasto_ahorros]
-
-            # Si no hay gasto, no mostrar gráfico
-            if sum(valores) == 0:
-                st.info("No se han registrado gastos este mes.")
-            else:
-                import matplotlib.pyplot as plt
-                plt.style.use("dark_background")
-                fig, ax = plt.subplots()
-                ax.pie(valores, labels=labels, autopct="%1.1f%%", startangle=90)
-                ax.set_title("Distribución del Gasto por Origen")
-                st.pyplot(fig)
+    except Exception as e:
+        st.error("No se pudo generar el gráfico de distribución.")
+        st.text(f"Error: {e}")
 
-        except Exception as e:
-            st.error("No se pudo generar el gráfico de distribución.")
-            st.text(f"Error: {e}")
 
+@vistas_reportes.vista("📆 Evolución Mensual")
+def vista_evolucion():
+    st.markdown("📆 Evolución Mensual de Ingresos, Gastos y Saldo Real")
 
-    with rep_tabs[2]:  
-        st.markdown("📆 Evolución Mensual de Ingresos, Gastos y Saldo Real")
+    try:
+        agregados = obtener_agregados(con_archivo=True)
+        df_merge = agregados[agregados["con_ingresos"]]
 
-        try:
-            df_ing = read_sheet_as_df(sheet, "Ingresos")
-            df_gas = read_sheet_as_df(sheet, "Gastos Fijos")
-            df_deu = read_sheet_as_df(sheet, "Deudas")
-            df_pro = read_sheet_as_df(sheet, "Provisiones")
-            df_aho = read_sheet_as_df(sheet, "Ahorros")
-
-            # Agrupar
-            df_ingresos = df_ing.groupby(["año", "mes"])["monto"].sum().reset_index(name="ingresos")
-            df_gas_pag = df_gas[df_gas["estado"].str.lower() == "pagado"]
-            df_gastos_fijos = df_gas_pag.groupby(["año", "mes"])["monto"].sum().reset_index(name="gastos_fijos")
-
-            df_deu["gasto_deuda"] = df_deu["monto_cuota"] * df_deu["cuotas_mes"]
-            df_gastos_deuda = df_deu.groupby(["año", "mes"])["gasto_deuda"].sum().reset_index(name="deudas")
-
-            df_gastos_prov = df_pro.groupby(["año", "mes"])["monto_usado"].sum().reset_index(name="provisiones_usadas")
-            df_ahorros_ret = df_aho.groupby(["año", "mes"])["monto_retirado"].sum().reset_index(name="ahorros_usados")
-            df_ahorros_ing = df_aho.groupby(["año", "mes"])["monto_ingreso"].sum().reset_index(name="ahorros_guardados")
-            df_prov_guardadas = df_pro.groupby(["año", "mes"])["monto"].sum().reset_index(name="provisiones_guardadas")
-
-            # Merge general
-            df_merge = df_ingresos \
-                .merge(df_gastos_fijos, on=["año", "mes"], how="left") \
-                .merge(df_gastos_deuda, on=["año", "mes"], how="left") \
-                .merge(df_gastos_prov, on=["año", "mes"], how="left") \
-                .merge(df_ahorros_ret, on=["año", "mes"], how="left") \
-                .merge(df_ahorros_ing, on=["año", "mes"], how="left") \
-                .merge(df_prov_guardadas, on=["año", "mes"], how="left")
-
-            df_merge.fillna(0, inplace=True)
-
-            # Cálculos
-            df_merge["gastos_totales"] = df_merge["gastos_fijos"] + df_merge["deudas"] + df_merge["provisiones_usadas"] + df_merge["ahorros_usados"]
-            df_merge["saldo_real"] = df_merge["ingresos"] - df_merge["gastos_totales"] - df_merge["provisiones_guardadas"] - df_merge["ahorros_guardados"]
-            df_merge["periodo"] = df_merge["mes"].astype(str).str.zfill(2) + "/" + df_merge["año"].astype(str)
-
-            # Gráfico
-            import matplotlib.pyplot as plt
-            plt.style.use("dark_background")
-            fig, ax = plt.subplots()
-            ax.plot(df_merge["periodo"], df_merge["ingresos"], label="Ingresos", marker="o", color="#4CAF50")
-            ax.plot(df_merge["periodo"], df_merge["gastos_totales"], label="Gastos Totales", marker="o", color="#F44336")
-            ax.plot(df_merge["periodo"], df_merge["saldo_real"], label="Saldo Disponible Real", marker="o", color="#2196F3")
-
-            ax.set_title("Evolución de Ingresos, Gastos y Saldo Real")
-            ax.set_ylabel("CLP")
-            ax.set_xlabel("Mes/Año")
-            ax.tick_params(axis="x", rotation=45)
-            ax.legend()
-            st.pyplot(fig)
+        # Gráfico
+        png = graficos.lineas_evolucion(df_merge["periodo"], df_merge["ingresos"], df_merge["gastos_totales"], df_merge["saldo_real"])
+        st.image(png, use_container_width=True)
 
-        except Exception as e:
-            st.error("No se pudo generar el gráfico de evolución.")
-            st.text(f"Error: {e}")
+    except Exception as e:
+        st.error("No se pudo generar el gráfico de evolución.")
+        st.text(f"Error: {e}")
 
 
-    with rep_tabs[3]:  
-        st.markdown(" 📤 Exportar tus datos")
+@vistas_reportes.vista("📤 Exportar Resumen")
+def vista_exportar():
+    st.markdown(" 📤 Exportar tus datos")
 
-        try:
-            hojas = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros", "Reservas Familiares"]
-            dfs_mes = {}
-            dfs_año = {}
-
-            for hoja in hojas:
-                df = df_hojas.get(hoja, pd.DataFrame())
-
-                if "mes" in df.columns and "año" in df.columns:
-                    df_mes = df[(df["mes"] == mes) & (df["año"] == año)]
-                    df_año = df[df["año"] == año]
-                else:
-                    df_mes = df.copy()
-                    df_año = df.copy()
-
-                dfs_mes[hoja] = df_mes
-                dfs_año[hoja] = df_año
-
-            # === Botón para descargar resumen mensual
-            if st.button("📥 Descargar resumen mensual en Excel"):
-                output = io.BytesIO()
-                wb = Workbook()
-                for nombre, df in dfs_mes.items():
-                    ws = wb.create_sheet(title=nombre[:31])
-                    for r in dataframe_to_rows(df, index=False, header=True):
-                        ws.append(r)
-                wb.remove(wb["Sheet"])
-                wb.save(output)
-                st.download_button(
-                    label="⬇️ Descargar archivo mensual",
-                    data=output.getvalue(),
-                    file_name=f"Resumen_{mes}_{año}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-
-            # === Botón para descargar resumen anual
-            if st.button("📥 Descargar histórico anual en Excel"):
-                output = io.BytesIO()
-                wb = Workbook()
-                for nombre, df in dfs_año.items():
-                    ws = wb.create_sheet(title=nombre[:31])
-                    for r in dataframe_to_rows(df, index=False, header=True):
-                        ws.append(r)
-                wb.remove(wb["Sheet"])
-                wb.save(output)
-                st.download_button(
-                    label="⬇️ Descargar archivo anual",
-                    data=output.getvalue(),
-                    file_name=f"Resumen_Anual_{año}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+    try:
+        hojas = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros", "Reservas Familiares"]
+        archivados = {a for años_hoja in almacen.años_archivados().values() for a in años_hoja}
+        tablas = obtener_tablas(hojas)
+        version_datos = versiones(hojas)
+
+        # === Botón para descargar resumen mensual
+        if st.button("📥 Descargar resumen mensual en Excel"):
+            # El archivo queda en caché hasta que cambie alguna hoja; un mes de
+            # un año archivado se lee desde sus pestañas de archivo
+            con_archivo = año in archivados
+            tablas_mes = obtener_tablas(hojas, con_archivo)
+            datos = exportar_excel(
+                ("mensual", año, mes, version_datos, almacen.version_archivo() if con_archivo else None),
+                {hoja: tablas_mes[hoja].mes(año, mes) for hoja in hojas},
+            )
+            st.download_button(
+                label="⬇️ Descargar archivo mensual",
+                data=datos,
+                file_name=f"Resumen_{mes}_{año}.xlsx",
+                mime=MIME_XLSX
+            )
+
+        # === Botón para descargar resumen anual
+        if st.button("📥 Descargar histórico anual en Excel"):
+            # Un año archivado se lee desde sus pestañas de archivo
+            con_archivo = año in archivados
+            tablas_año = obtener_tablas(hojas, con_archivo)
+            datos = exportar_excel(
+                ("anual", año, version_datos, almacen.version_archivo() if con_archivo else None),
+                {hoja: tablas_año[hoja].año(año) for hoja in hojas},
+            )
+            st.download_button(
+                label="⬇️ Descargar archivo anual",
+                data=datos,
+                file_name=f"Resumen_Anual_{año}.xlsx",
+                mime=MIME_XLSX
+            )
+
+        # === Rango de meses (varios años) en CSV o Parquet
+        st.markdown("📦 Exportar un rango de meses")
+        col1, col2, col3, col4 = st.columns(4)
+        mes_desde = col1.selectbox("Desde (mes)", list(range(1, 13)), index=0, key="rango_mes_desde")
+        año_desde = col2.selectbox("Desde (año)", AÑOS, index=0, key="rango_año_desde")
+        mes_hasta = col3.selectbox("Hasta (mes)", list(range(1, 13)), index=mes - 1, key="rango_mes_hasta")
+        año_hasta = col4.selectbox("Hasta (año)", AÑOS, index=AÑOS.index(año), key="rango_año_hasta")
+        formato = st.radio("Formato", list(FORMATOS), horizontal=True, key="rango_formato")
+
+        desde, hasta = (año_desde, mes_desde), (año_hasta, mes_hasta)
+        if desde > hasta:
+            st.warning("El mes inicial debe ser anterior al mes final.")
+        else:
+            # El archivo se genera recién al hacer clic, hoja por hoja y mes a mes
+            if archivados and año_desde <= max(archivados):
+                tablas = obtener_tablas(hojas, con_archivo=True)
+            st.download_button(
+                label=f"⬇️ Descargar {mes_desde:02d}/{año_desde} a {mes_hasta:02d}/{año_hasta} ({formato})",
+                data=lambda: LectorGenerador(generar_rango(tablas, desde, hasta, formato)),
+                file_name=f"Historico_{año_desde}-{mes_desde:02d}_{año_hasta}-{mes_hasta:02d}_{FORMATOS[formato]}.zip",
+                mime=MIME_ZIP
+            )
 
-        except Exception as e:
-            st.error("No se pudo generar el archivo para exportar.")
-            st.text(f"Error: {e}")
-        
-with main_tabs[4]:
+    except Exception as e:
+        st.error("No se pudo generar el archivo para exportar.")
+        st.text(f"Error: {e}")
+    
+@vistas_principales.vista("🧮 Simulador")
+def vista_simulador():
     st.subheader("🧮 Simulador de Próximo Mes")
 
     # Calcular próximo mes
@@ -541,17 +683,12 @@ with main_tabs[4]:
     st.markdown(f" Simulación para: **{nuevo_mes}/{nuevo_año}**")
 
     # === Valores base desde el mes actual
-    df_ing = df_hojas["Ingresos"]
-    df_gas = df_hojas["Gastos Fijos"]
-    df_deu = df_hojas["Deudas"]
-    df_pro = df_hojas["Provisiones"]
-    df_aho = df_hojas["Ahorros"]
-
-    ingreso_real = df_ing[(df_ing["mes"] == mes) & (df_ing["año"] == año)]["monto"].sum()
-    gastos_fijos_reales = df_gas[(df_gas["mes"] == mes) & (df_gas["año"] == año) & (df_gas["estado"].str.lower() == "pagado")]["monto"].sum()
-    provisiones_real = df_pro[(df_pro["mes"] == mes) & (df_pro["año"] == año)]["monto"].sum()
-    ahorro_real = df_aho[(df_aho["mes"] == mes) & (df_aho["año"] == año)]["monto_ingreso"].sum()
-    deudas_real = (df_deu[(df_deu["mes"] == mes) & (df_deu["año"] == año)]["monto_cuota"] * df_deu["cuotas_mes"]).sum()
+    fila = obtener_mes_actual()
+    ingreso_real = fila["ingresos"]
+    gastos_fijos_reales = fila["gastos_fijos"]
+    provisiones_real = fila["provisiones_guardadas"]
+    ahorro_real = fila["ahorros_guardados"]
+    deudas_real = fila["deudas"]
 
     # Entradas del usuario
     ingreso_simulado = st.number_input("💰 Ingreso estimado", min_value=0, value=int(ingreso_real), step=10000)
@@ -581,11 +718,126 @@ with main_tabs[4]:
     if ingreso_simulado == 0 or sum(valores) == 0:
         st.info("No hay ingreso simulado para mostrar la distribución.")
     else:
-        import matplotlib.pyplot as plt
-        plt.style.use("dark_background")
-        fig, ax = plt.subplots()
-        ax.pie(valores, labels=etiquetas, autopct="%1.1f%%", startangle=90)
-        ax.set_title("Distribución proyectada del ingreso")
-        st.pyplot(fig)
+        png = graficos.torta(valores, etiquetas, "Distribución proyectada del ingreso")
+        st.image(png, use_container_width=True)
+
+    # === Proyección a varios meses ===
+    st.markdown(" 🎲 Proyección a varios meses")
+    st.caption(
+        f"{ESCENARIOS:,} escenarios en torno a los montos estimados, con la variación "
+        "que tuvo cada categoría en tu historial.".replace(",", ".")
+    )
+    meses_proyeccion = st.slider("📅 Meses a proyectar", min_value=1, max_value=24, value=6)
+    saldo_inicial = st.number_input("💵 Saldo con el que empiezas", value=0, step=10000)
+
+    try:
+        coeficientes = obtener_variabilidad()
+        estimados = {
+            "ingresos": ingreso_simulado,
+            "gastos_fijos": gasto_estimado,
+            "deudas": deuda_estimadas,
+            "provisiones_guardadas": provisiones_estimadas,
+            "ahorros_guardados": ahorro_estimado,
+        }
+        with metricas.medir("calculo_segundos", calculo="simulacion"):
+            proyeccion = simular(estimados, coeficientes, meses_proyeccion, saldo_inicial)
 
+        periodos = []
+        m, a = mes, año
+        for _ in range(meses_proyeccion):
+            m, a = obtener_mes_siguiente(m, a)
+            periodos.append(f"{m:02d}/{a}")
+        proyeccion.index = periodos
 
+        final = proyeccion.iloc[-1]
+        col1, col2, col3 = st.columns(3)
+        col1.metric(f"🧮 Saldo esperado a {periodos[-1]}", clp(final["p50"]))
+        col2.metric("📉 Escenario pesimista (5%)", clp(final["p5"]))
+        col3.metric("⚠️ Probabilidad de saldo negativo", f"{final['prob_negativo'] * 100:.1f}%")
+
+        png = graficos.bandas_proyeccion(
+            periodos, proyeccion["p5"], proyeccion["p25"], proyeccion["p50"], proyeccion["p75"], proyeccion["p95"]
+        )
+        st.image(png, use_container_width=True)
+
+        tabla = pd.DataFrame({
+            "Pesimista (5%)": proyeccion["p5"].map(clp),
+            "Mediana": proyeccion["p50"].map(clp),
+            "Optimista (95%)": proyeccion["p95"].map(clp),
+            "Prob. saldo negativo": (proyeccion["prob_negativo"] * 100).map("{:.1f}%".format),
+        }, index=proyeccion.index)
+        st.dataframe(tabla, use_container_width=True)
+    except Exception as e:
+        st.warning("No se pudo calcular la proyección.")
+        st.text(f"Error: {e}")
+
+
+vistas_principales.mostrar()
+
+# Se avisa al final, cuando ya se sabe si alguna hoja vino de la copia local
+if almacen.solo_lectura:
+    aviso_conexion.warning(
+        "⚠️ Google Sheets no responde: se muestran los datos guardados localmente. "
+        "Los cambios quedan deshabilitados hasta recuperar la conexión."
+    )
+
+# Al final, para incluir lo que se guardó en esta misma ejecución. Mientras
+# haya algo en cola el estado se refresca solo cada 2 segundos.
+with st.sidebar:
+    st.fragment(mostrar_estado_guardado, run_every=2 if almacen.estado()["pendientes"] else None)()
+
+# === Panel de métricas (depuración) ===
+def tabla_api(series):
+    # Una fila por (operación, hoja) con llamadas, errores, bytes y latencia
+    filas = {}
+    for serie in series:
+        if not serie["nombre"].startswith("api_"):
+            continue
+        etiquetas = serie["etiquetas"]
+        fila = filas.setdefault((etiquetas.get("operacion", ""), etiquetas.get("hoja", "")), {
+            "operación": etiquetas.get("operacion", ""), "hoja": etiquetas.get("hoja", ""),
+            "llamadas": 0, "errores": 0, "KB recibidos": 0.0, "KB enviados": 0.0,
+            "ms promedio": 0.0, "ms máximo": 0.0,
+        })
+        if serie["nombre"] == "api_llamadas_total":
+            fila["llamadas"] += serie["valor"]
+        elif serie["nombre"] == "api_errores_total":
+            fila["errores"] += serie["valor"]
+        elif serie["nombre"] == "api_bytes_recibidos_total":
+            fila["KB recibidos"] += serie["valor"] / 1024
+        elif serie["nombre"] == "api_bytes_enviados_total":
+            fila["KB enviados"] += serie["valor"] / 1024
+        elif serie["nombre"] == "api_segundos":
+            fila["ms promedio"] = serie["promedio"] * 1000
+            fila["ms máximo"] = serie["maximo"] * 1000
+    return pd.DataFrame(list(filas.values()))
+
+def tabla_tiempos(series):
+    return pd.DataFrame([
+        {
+            "medida": serie["nombre"],
+            "detalle": ", ".join(str(v) for v in serie["etiquetas"].values()),
+            "veces": serie["cantidad"],
+            "ms promedio": serie["promedio"] * 1000,
+            "ms máximo": serie["maximo"] * 1000,
+        }
+        for serie in series
+        if serie["tipo"] == "tiempo" and not serie["nombre"].startswith("api_")
+    ])
+
+def mostrar_panel_metricas():
+    series = metricas.resumen()
+    with st.expander("🛠️ Métricas de rendimiento (desde que arrancó el servidor)", expanded=True):
+        st.markdown("**API de Google**")
+        st.dataframe(tabla_api(series), hide_index=True, use_container_width=True)
+        st.markdown("**Secciones, cálculos, gráficos y exportaciones**")
+        st.dataframe(tabla_tiempos(series), hide_index=True, use_container_width=True)
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("⬇️ JSON", data=metricas.a_json(), file_name="metricas.json", mime="application/json")
+        col2.download_button("⬇️ Prometheus", data=metricas.a_prometheus(), file_name="metricas.prom", mime="text/plain")
+        col3.button("🧹 Reiniciar métricas", on_click=metricas.reiniciar)
+
+# El rerun completo se mide antes de mostrar el panel para incluirlo en él
+metricas.observar("rerun_segundos", time.perf_counter() - inicio_rerun)
+if st.sidebar.toggle("🛠️ Métricas de rendimiento", key="panel_metricas"):
+    mostrar_panel_metricas()
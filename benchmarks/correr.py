@@ -0,0 +1,280 @@
+# benchmarks/correr.py
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from benchmarks.datos import contar_filas, generar_planilla  # noqa: E402
+from benchmarks.planilla_falsa import PlanillaFalsa, instalada  # noqa: E402
+
+# === Benchmark de la app ===
+# Corre app.py con AppTest de Streamlit contra la planilla en memoria y mide
+# cada paso: arranque, PIN, cada sección, exportaciones, guardado y "Ir a
+# nuevo mes". Por paso informa segundos, llamadas a la API y (con --memoria)
+# el pico de memoria de Python. Uso, desde la raíz del proyecto:
+#
+#   python -m benchmarks.correr --filas 1k 100k 1M --latencia 0.2
+#
+# Con --json se guardan los resultados para comparar entre versiones.
+APP = os.path.join(RAIZ, "app.py")
+BANNER = os.path.join(RAIZ, "banner_makaboom.png")
+PIN = "0000"
+TIMEOUT = 900   # segundos por rerun (con 1M de filas el primer arranque es largo)
+
+
+def _filas(texto):
+    # "1k" -> 1000, "1M" -> 1000000
+    texto = texto.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(texto[-1], 1)
+    return int(float(texto.rstrip("km")) * factor)
+
+
+def reiniciar_proceso():
+    # Deja los módulos de la app como recién importados, igual que al
+    # reiniciar el servidor. La copia local en disco (.snapshot) se conserva.
+    import almacenamiento
+    import cola_escritura
+    import exportar
+    import google_sheets
+    import graficos
+    import libro_cuentas
+    import metricas
+    import periodos
+    import vistas
+
+    for cola in list(cola_escritura._colas.values()):
+        cola.esperar()
+    cola_escritura._colas.clear()
+    google_sheets.reset_state()
+    vistas._memo.clear()
+    periodos._tablas.clear()
+    libro_cuentas._libros.clear()
+    graficos._imagenes.clear()
+    exportar._archivos.clear()
+    almacenamiento._almacenes.clear()
+    almacenamiento._sincronizadas.clear()
+    metricas.reiniciar()
+
+
+def nueva_app(backend, autorizado=True):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=TIMEOUT)
+    at.secrets["credentials"] = {"type": "service_account", "client_email": "benchmark@example.com"}
+    at.secrets["security"] = {"pin": PIN}
+    if backend == "sqlite":
+        at.secrets["storage"] = {"backend": "sqlite", "path": os.path.join(".datos", "finanzas.sqlite")}
+    if autorizado:
+        at.session_state["acceso_autorizado"] = True
+    return at
+
+
+class Medidor:
+    def __init__(self, planilla, memoria):
+        self.planilla = planilla
+        self.memoria = memoria
+        self.pasos = []
+
+    def medir(self, paso, accion):
+        # accion() puede devolver un AppTest para recoger sus errores
+        llamadas = self.planilla.total_llamadas
+        errores_api = sum(self.planilla.errores.values())
+        if self.memoria:
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        resultado = accion()
+        fila = {
+            "paso": paso,
+            "segundos": time.perf_counter() - inicio,
+            "llamadas_api": self.planilla.total_llamadas - llamadas,
+            "errores_429": sum(self.planilla.errores.values()) - errores_api,
+        }
+        if self.memoria:
+            fila["pico_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        if hasattr(resultado, "exception"):
+            # Solo excepciones: st.error también se usa para las alertas de la app
+            fila["errores"] = [str(e.value) for e in resultado.exception]
+        elif isinstance(resultado, dict):
+            fila.update(resultado)
+        self.pasos.append(fila)
+        return resultado
+
+
+def _boton(at, texto):
+    return next(b for b in at.button if texto in b.label)
+
+
+def _exportar_rango(formato):
+    # Descarga de un rango (todo el historial) consumiendo el generador como
+    # lo hace download_button; las hojas ya están en el caché de la app
+    import google_sheets
+    from almacenamiento import AlmacenSheets
+    from exportar import generar_rango
+    from periodos import TablaPeriodos
+
+    _, sheet = next(iter(google_sheets._clients.values()))
+    almacen = AlmacenSheets(sheet)
+    hojas = ["Ingresos", "Gastos Fijos", "Deudas", "Provisiones", "Ahorros", "Reservas Familiares"]
+    tablas = {hoja: TablaPeriodos(df) for hoja, df in almacen.leer_varias(hojas).items()}
+    total = sum(len(trozo) for trozo in generar_rango(tablas, (1900, 1), (9999, 12), formato))
+    return {"bytes": total}
+
+
+def correr_escenario(filas, args):
+    pestañas = generar_planilla(filas)
+    planilla = PlanillaFalsa(
+        pestañas, latencia=args.latencia, latencia_por_mil_celdas=args.latencia_por_mil_celdas,
+        lecturas_por_minuto=args.lecturas_por_minuto, escrituras_por_minuto=args.escrituras_por_minuto,
+        prob_error=args.prob_error,
+    )
+    medidor = Medidor(planilla, args.memoria)
+    reiniciar_proceso()
+
+    with instalada(planilla):
+        pin = nueva_app(args.backend, autorizado=False)
+        medidor.medir("pantalla_pin", lambda: pin.run())
+
+        at = nueva_app(args.backend)
+        medidor.medir("arranque_en_frio", lambda: at.run())
+        medidor.medir("rerun", lambda: at.run())
+
+        for seccion in at.radio(key="vista_principal").options:
+            medidor.medir(f"seccion: {seccion}", lambda: at.radio(key="vista_principal").set_value(seccion).run())
+            if at.radio(key="vista_principal").value == "📈 Reportes y Análisis":
+                for reporte in at.radio(key="vista_reportes").options:
+                    medidor.medir(f"reporte: {reporte}", lambda: at.radio(key="vista_reportes").set_value(reporte).run())
+
+        # === Exportaciones ===
+        at.radio(key="vista_principal").set_value("📈 Reportes y Análisis").run()
+        at.radio(key="vista_reportes").set_value("📤 Exportar Resumen").run()
+        medidor.medir("exportar_excel_mensual", lambda: _boton(at, "resumen mensual en Excel").click().run())
+        medidor.medir("exportar_excel_anual", lambda: _boton(at, "histórico anual en Excel").click().run())
+        if args.backend == "sheets":
+            medidor.medir("exportar_rango_csv", lambda: _exportar_rango("CSV"))
+            medidor.medir("exportar_rango_parquet", lambda: _exportar_rango("Parquet"))
+
+        # === Guardado de un mes (cola en segundo plano) ===
+        at.radio(key="vista_principal").set_value("📋 Datos Detallados").run()
+        medidor.medir("guardar_mes", lambda: _boton(at, "Guardar cambios en Gastos Fijos").click().run())
+        import cola_escritura
+        medidor.medir("escritura_en_cola", lambda: [cola.esperar() for cola in cola_escritura._colas.values()] and None)
+
+        # === Ir a nuevo mes ===
+        medidor.medir("ir_a_nuevo_mes", lambda: _boton(at, "Ir a nuevo mes").click().run())
+
+        # === Reinicio del servidor con la copia local en disco ===
+        reiniciar_proceso()
+        reinicio = nueva_app(args.backend)
+        medidor.medir("reinicio_con_copia_local", lambda: reinicio.run())
+
+    return {
+        "filas": contar_filas(pestañas),
+        "pasos": medidor.pasos,
+        "llamadas_por_metodo": dict(planilla.llamadas),
+    }
+
+
+# Proceso nuevo: tiempo del primer run de app.py hasta la pantalla del PIN,
+# con las importaciones que haga la app (lo que ve quien la abre tras un
+# reinicio del servidor). Streamlit ya está cargado, como en el servidor.
+PIN_EN_FRIO = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.secrets["security"] = {"pin": "0000"}
+inicio = time.perf_counter()
+at.run()
+print(json.dumps({
+    "segundos": time.perf_counter() - inicio,
+    "modulos": len(sys.modules),
+    "errores": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def _medir_pin_en_frio(directorio):
+    salida = subprocess.run(
+        [sys.executable, "-c", PIN_EN_FRIO, APP],
+        cwd=directorio, capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _imprimir(escenario, memoria):
+    print(f"\n== {escenario['filas']:,} filas ==".replace(",", "."))
+    encabezado = f"{'paso':<48}{'segundos':>10}{'llamadas':>10}{'429':>6}" + (f"{'pico MB':>10}" if memoria else "")
+    print(encabezado)
+    print("-" * len(encabezado))
+    for p in escenario["pasos"]:
+        linea = f"{p['paso']:<48}{p['segundos']:>10.3f}{p['llamadas_api']:>10}{p['errores_429']:>6}"
+        if memoria:
+            linea += f"{p['pico_mb']:>10.1f}"
+        if p.get("errores"):
+            linea += f"  ⚠️ {p['errores'][0][:60]}"
+        if p.get("bytes"):
+            linea += f"  ({p['bytes'] / 1024:,.0f} KB)"
+        print(linea)
+    print("llamadas por método:", ", ".join(f"{k}={v}" for k, v in sorted(escenario["llamadas_por_metodo"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la app contra una planilla en memoria")
+    parser.add_argument("--filas", nargs="+", default=["1k", "10k", "100k"], help="tamaños a probar (p. ej. 1k 100k 1M)")
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], default="sheets")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por llamada a la API")
+    parser.add_argument("--latencia-por-mil-celdas", type=float, default=0.0, help="segundos extra por cada mil celdas")
+    parser.add_argument("--lecturas-por-minuto", type=int, default=None, help="cuota de lecturas (429 al superarla)")
+    parser.add_argument("--escrituras-por-minuto", type=int, default=None, help="cuota de escrituras (429 al superarla)")
+    parser.add_argument("--prob-error", type=float, default=0.0, help="probabilidad de un 429 al azar por llamada")
+    parser.add_argument("--memoria", action="store_true", help="mide el pico de memoria por paso (más lento)")
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    # Los avisos de Streamlit en modo sin servidor no aportan a la medición
+    import logging
+    import warnings
+    warnings.filterwarnings("ignore")
+    logging.disable(logging.WARNING)
+    if args.memoria:
+        tracemalloc.start()
+
+    directorio = tempfile.mkdtemp(prefix="benchmark-appgastos-")
+    origen = os.getcwd()
+    try:
+        # La app usa rutas relativas (banner, .snapshot, .datos): corre en un directorio temporal
+        os.symlink(BANNER, os.path.join(directorio, os.path.basename(BANNER)))
+        os.chdir(directorio)
+        resultados = {"config": {k: v for k, v in vars(args).items() if k != "json"}, "escenarios": []}
+        resultados["pin_en_frio"] = _medir_pin_en_frio(directorio)
+        print(f"Pantalla del PIN en un proceso nuevo: {resultados['pin_en_frio']['segundos']:.3f} s "
+              f"({resultados['pin_en_frio']['modulos']} módulos cargados)")
+        for texto in args.filas:
+            shutil.rmtree(os.path.join(directorio, ".snapshot"), ignore_errors=True)
+            shutil.rmtree(os.path.join(directorio, ".datos"), ignore_errors=True)
+            escenario = correr_escenario(_filas(texto), args)
+            resultados["escenarios"].append(escenario)
+            _imprimir(escenario, args.memoria)
+        # En Linux ru_maxrss viene en KB
+        resultados["memoria_maxima_proceso_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"\nMemoria máxima del proceso: {resultados['memoria_maxima_proceso_mb']:.0f} MB")
+    finally:
+        os.chdir(origen)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/datos.py
+import datetime
+
+import numpy as np
+
+# === Datos de prueba ===
+# Genera las seis hojas con mes/año más Cuentas con la misma forma que la
+# planilla real, repartiendo `filas` entre las hojas. Las filas van ordenadas
+# por período, como quedan en la planilla al agregar mes a mes.
+CUENTAS = [["nombre_cuenta", "banco", "tipo"], ["Cuenta Corriente", "Banco A", "corriente"],
+           ["Cuenta Vista", "Banco B", "vista"], ["Ahorro", "Banco A", "ahorro"]]
+
+# Hoja -> (parte de las filas, encabezados)
+HOJAS = {
+    "Ingresos": (0.15, ["descripcion", "monto", "cuenta", "mes", "año"]),
+    "Gastos Fijos": (0.40, ["item", "monto", "estado", "cuenta_pago", "mes", "año"]),
+    "Deudas": (0.10, ["deuda", "monto_cuota", "cuotas_mes", "mes", "año"]),
+    "Provisiones": (0.15, ["item", "monto", "se_uso", "monto_usado", "mes", "año"]),
+    "Ahorros": (0.10, ["item", "monto_ingreso", "monto_retirado", "cuenta", "mes", "año"]),
+    "Reservas Familiares": (0.10, ["item", "monto", "cuenta", "mes", "año"]),
+}
+
+
+def periodos(desde, hasta):
+    # Lista de (año, mes) entre desde y hasta, inclusive
+    año, mes = desde
+    lista = []
+    while (año, mes) <= hasta:
+        lista.append((año, mes))
+        año, mes = (año + 1, 1) if mes == 12 else (año, mes + 1)
+    return lista
+
+
+def _columnas(hoja, n, rng):
+    # Valores por columna (sin mes/año) para n filas
+    cuentas = np.array([c[0] for c in CUENTAS[1:]], dtype=object)
+    montos = lambda bajo, alto: (rng.integers(bajo, alto, n) * 1000).tolist()
+    elegir = lambda opciones, p=None: rng.choice(np.array(opciones, dtype=object), n, p=p).tolist()
+    valores = {
+        "Ingresos": lambda: [elegir(["Sueldo", "Honorarios", "Bono"]), montos(200, 2000), elegir(cuentas)],
+        "Gastos Fijos": lambda: [elegir(["Arriendo", "Luz", "Agua", "Internet", "Supermercado"]),
+                                 montos(5, 400), elegir(["Pagado", "pendiente"], [0.8, 0.2]), elegir(cuentas)],
+        "Deudas": lambda: [elegir(["Crédito", "Tarjeta"]), montos(20, 300), rng.integers(0, 2, n).tolist()],
+        "Provisiones": lambda: [elegir(["Vacaciones", "Permisos", "Seguros"]), montos(0, 200),
+                                elegir(["Si", "No"]), montos(0, 100)],
+        "Ahorros": lambda: [elegir(["Fondo", "Emergencia"]), montos(0, 300), montos(0, 50), elegir(cuentas)],
+        "Reservas Familiares": lambda: [elegir(["Mamá", "Colegio"]), montos(10, 200), elegir(cuentas)],
+    }
+    return valores[hoja]()
+
+
+def generar_planilla(filas, desde=(2021, 1), hasta=None, semilla=0):
+    # {pestaña: [encabezados, fila, ...]} con alrededor de `filas` filas en total
+    if hasta is None:
+        hoy = datetime.date.today()
+        hasta = (hoy.year, hoy.month)
+    meses = periodos(desde, hasta)
+    rng = np.random.default_rng(semilla)
+    pestañas = {}
+    for hoja, (parte, encabezados) in HOJAS.items():
+        n = max(len(meses), int(filas * parte))
+        # Fila i -> mes i * len(meses) // n: repartidas parejo y en orden
+        indices = np.arange(n) * len(meses) // n
+        años = [meses[i][0] for i in indices]
+        mes = [meses[i][1] for i in indices]
+        columnas = _columnas(hoja, n, rng) + [mes, años]
+        pestañas[hoja] = [encabezados] + [list(fila) for fila in zip(*columnas)]
+    pestañas["Cuentas"] = [list(f) for f in CUENTAS]
+    return pestañas
+
+
+def contar_filas(pestañas):
+    return sum(len(filas) - 1 for filas in pestañas.values())
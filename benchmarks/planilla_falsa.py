@@ -0,0 +1,293 @@
+# benchmarks/planilla_falsa.py
+import datetime
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import gspread
+import requests
+
+# === Planilla en memoria ===
+# Reemplaza al cliente de gspread que crea connect_to_sheet: implementa solo
+# lo que usa google_sheets.py (values_get, values_batch_get, worksheet,
+# worksheets, batch_update, clear, update y get_lastUpdateTime) sobre listas
+# de filas en memoria. Cada llamada cuenta como una llamada a la API, puede
+# tardar una latencia configurable y puede fallar con 429 como la real.
+
+
+class _RespuestaError:
+    # Lo mínimo que gspread.exceptions.APIError necesita de una respuesta HTTP
+    def __init__(self, codigo, mensaje):
+        self.status_code = codigo
+        self._error = {"code": codigo, "message": mensaje, "status": "ERROR"}
+        self.text = mensaje
+
+    def json(self):
+        return {"error": self._error}
+
+
+def _error_api(codigo, mensaje):
+    return gspread.exceptions.APIError(_RespuestaError(codigo, mensaje))
+
+
+def _nombre_pestaña(rango):
+    # "'Mamá''s 2024'!A1:B2" -> "Mamá's 2024"
+    nombre = rango.split("!")[0]
+    if nombre.startswith("'") and nombre.endswith("'"):
+        nombre = nombre[1:-1].replace("''", "'")
+    return nombre
+
+
+def _texto(valor):
+    # Lo que devuelve la API con FORMATTED_VALUE: todo como texto
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+
+def _valor_celda(celda):
+    valor = celda.get("userEnteredValue", {})
+    return _texto(next(iter(valor.values()))) if valor else ""
+
+
+def _recortar(filas):
+    # La API no devuelve celdas ni filas vacías al final
+    filas = [list(f) for f in filas]
+    for fila in filas:
+        while fila and fila[-1] == "":
+            fila.pop()
+    while filas and not filas[-1]:
+        filas.pop()
+    return filas
+
+
+class HojaFalsa:
+    def __init__(self, planilla, id, title, filas):
+        self._planilla = planilla
+        self.id = id
+        self.title = title
+        self.filas = [[_texto(v) for v in fila] for fila in filas]
+
+    @property
+    def col_count(self):
+        return max([26] + [len(f) for f in self.filas])
+
+    @property
+    def row_count(self):
+        return max(1000, len(self.filas))
+
+    def clear(self):
+        self._planilla._llamada("clear", escritura=True)
+        self.filas = []
+        self._planilla._modificada()
+
+    def update(self, values, range_name=None):
+        self._planilla._llamada("update", escritura=True, celdas=sum(len(f) for f in values))
+        self.filas = [[_texto(v) for v in fila] for fila in values]
+        self._planilla._modificada()
+
+
+class PlanillaFalsa:
+    # pestañas: {nombre: [encabezados, fila, ...]}
+    # latencia: segundos fijos por llamada; latencia_por_mil_celdas: extra según el tamaño
+    # lecturas_por_minuto / escrituras_por_minuto: por encima de eso responde 429 (None = sin límite)
+    # prob_error: probabilidad de un 429 al azar en cualquier llamada
+
+    def __init__(self, pestañas, id="planilla-falsa", latencia=0.0, latencia_por_mil_celdas=0.0,
+                 lecturas_por_minuto=None, escrituras_por_minuto=None, prob_error=0.0, semilla=0):
+        self.id = id
+        self.latencia = latencia
+        self.latencia_por_mil_celdas = latencia_por_mil_celdas
+        self.cuotas = {"lectura": lecturas_por_minuto, "escritura": escrituras_por_minuto}
+        self.prob_error = prob_error
+        self.llamadas = Counter()     # método -> llamadas (incluye las que fallaron)
+        self.errores = Counter()      # método -> respuestas 429
+        self._recientes = {"lectura": deque(), "escritura": deque()}
+        self._azar = random.Random(semilla)
+        self._lock = threading.RLock()
+        self._modificaciones = 0
+        self._hojas = {}
+        for nombre, filas in pestañas.items():
+            self._agregar_hoja(len(self._hojas), nombre, filas)
+
+    # --- Contabilidad de llamadas ---
+    @property
+    def total_llamadas(self):
+        return sum(self.llamadas.values())
+
+    def _llamada(self, metodo, escritura=False, celdas=0):
+        tipo = "escritura" if escritura else "lectura"
+        with self._lock:
+            self.llamadas[metodo] += 1
+            ahora = time.monotonic()
+            recientes = self._recientes[tipo]
+            while recientes and ahora - recientes[0] > 60:
+                recientes.popleft()
+            recientes.append(ahora)
+            sin_cuota = self.cuotas[tipo] is not None and len(recientes) > self.cuotas[tipo]
+            al_azar = self.prob_error and self._azar.random() < self.prob_error
+        espera = self.latencia + self.latencia_por_mil_celdas * celdas / 1000
+        if espera:
+            time.sleep(espera)
+        if sin_cuota or al_azar:
+            with self._lock:
+                self.errores[metodo] += 1
+            raise _error_api(429, "Quota exceeded (planilla falsa)")
+
+    def _modificada(self):
+        with self._lock:
+            self._modificaciones += 1
+
+    # --- Pestañas ---
+    def _agregar_hoja(self, id, nombre, filas):
+        self._hojas[nombre] = HojaFalsa(self, id, nombre, filas)
+        return self._hojas[nombre]
+
+    def pestaña(self, nombre):
+        # Acceso directo para los benchmarks (no cuenta como llamada)
+        return self._hojas[nombre]
+
+    def _hoja(self, rango, metodo):
+        nombre = _nombre_pestaña(rango)
+        if nombre not in self._hojas:
+            # Una pestaña que no existe también gasta la llamada
+            self._llamada(metodo)
+            raise _error_api(400, f"Unable to parse range: {rango}")
+        return self._hojas[nombre]
+
+    # --- API usada por google_sheets.py ---
+    def values_get(self, range, params=None):
+        filas = _recortar(self._hoja(range, "values_get").filas)
+        self._llamada("values_get", celdas=sum(len(f) for f in filas))
+        return {"range": range, "values": filas} if filas else {"range": range}
+
+    def values_batch_get(self, ranges, params=None):
+        hojas = [self._hoja(r, "values_batch_get") for r in ranges]
+        valores = [_recortar(h.filas) for h in hojas]
+        self._llamada("values_batch_get", celdas=sum(len(f) for filas in valores for f in filas))
+        return {"valueRanges": [{"range": r, "values": v} for r, v in zip(ranges, valores)]}
+
+    def worksheet(self, title):
+        self._llamada("worksheet")
+        if title not in self._hojas:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._hojas[title]
+
+    def worksheets(self):
+        self._llamada("worksheets")
+        return list(self._hojas.values())
+
+    def get_lastUpdateTime(self):
+        self._llamada("get_lastUpdateTime")
+        base = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        return (base + datetime.timedelta(seconds=self._modificaciones)).isoformat()
+
+    def batch_update(self, body):
+        # Se aplica sobre copias y se confirma al final: todo o nada, como la API
+        pedidos = body["requests"]
+        celdas = sum(
+            len(fila.get("values", []))
+            for r in pedidos for v in r.values() for fila in v.get("rows", [])
+        )
+        self._llamada("batch_update", escritura=True, celdas=celdas)
+        with self._lock:
+            por_id = {h.id: h for h in self._hojas.values()}
+            nuevas = {}      # id -> HojaFalsa creada en este batch
+            trabajo = {}     # id -> copia de las filas
+            siguiente_id = max(por_id, default=-1) + 1
+
+            def filas_de(hoja_id):
+                if hoja_id not in trabajo:
+                    hoja = nuevas.get(hoja_id) or por_id.get(hoja_id)
+                    if hoja is None:
+                        raise _error_api(400, f"No grid with id: {hoja_id}")
+                    trabajo[hoja_id] = list(hoja.filas)
+                return trabajo[hoja_id]
+
+            for request in pedidos:
+                (tipo, datos), = request.items()
+                if tipo == "addSheet":
+                    propiedades = datos["properties"]
+                    titulo = propiedades["title"]
+                    if titulo in self._hojas or any(h.title == titulo for h in nuevas.values()):
+                        raise _error_api(400, f"A sheet with the name \"{titulo}\" already exists")
+                    hoja_id = propiedades.get("sheetId", siguiente_id)
+                    siguiente_id = max(siguiente_id, hoja_id) + 1
+                    nuevas[hoja_id] = HojaFalsa(self, hoja_id, titulo, [])
+                elif tipo == "updateCells":
+                    filas = filas_de(datos["start"]["sheetId"])
+                    i0, j0 = datos["start"]["rowIndex"], datos["start"]["columnIndex"]
+                    for di, fila in enumerate(datos["rows"]):
+                        while len(filas) <= i0 + di:
+                            filas.append([])
+                        nueva = list(filas[i0 + di])
+                        for dj, celda in enumerate(fila["values"]):
+                            while len(nueva) <= j0 + dj:
+                                nueva.append("")
+                            nueva[j0 + dj] = _valor_celda(celda)
+                        filas[i0 + di] = nueva
+                elif tipo == "appendCells":
+                    filas = filas_de(datos["sheetId"])
+                    while filas and all(c == "" for c in filas[-1]):
+                        filas.pop()
+                    filas.extend([_valor_celda(c) for c in fila["values"]] for fila in datos["rows"])
+                elif tipo == "deleteDimension":
+                    rango = datos["range"]
+                    if rango["dimension"] == "ROWS":
+                        del filas_de(rango["sheetId"])[rango["startIndex"]:rango["endIndex"]]
+                elif tipo == "insertDimension":
+                    rango = datos["range"]
+                    if rango["dimension"] == "ROWS":
+                        filas = filas_de(rango["sheetId"])
+                        filas[rango["startIndex"]:rango["startIndex"]] = [[] for _ in range(rango["endIndex"] - rango["startIndex"])]
+                elif tipo == "appendDimension":
+                    pass   # las filas y columnas crecen solas
+                else:
+                    raise _error_api(400, f"Request no soportado por la planilla falsa: {tipo}")
+
+            for hoja in nuevas.values():
+                self._hojas[hoja.title] = hoja
+            for hoja_id, filas in trabajo.items():
+                (nuevas.get(hoja_id) or por_id[hoja_id]).filas = filas
+            self._modificaciones += 1
+        return {"spreadsheetId": self.id, "replies": [{} for _ in pedidos]}
+
+
+class ClienteFalso:
+    # Lo que connect_to_sheet usa del cliente de gspread
+    def __init__(self, planilla):
+        self.planilla = planilla
+        self.http_client = type("HttpFalso", (), {})()
+        self.http_client.session = requests.Session()
+        self.http_client.auth = None
+        self.http_client.login = lambda: None
+
+    def set_timeout(self, timeout):
+        pass
+
+    def open_by_key(self, key):
+        self.planilla._llamada("open_by_key")
+        # Como en gspread, el id de la planilla es su key
+        self.planilla.id = key
+        return self.planilla
+
+
+@contextmanager
+def instalada(planilla):
+    # Mientras dura el bloque, connect_to_sheet se conecta a la planilla falsa
+    # (sin credenciales reales ni red)
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    authorize_original = gspread.authorize
+    credenciales_original = ServiceAccountCredentials.__dict__["from_json_keyfile_dict"]
+    gspread.authorize = lambda credenciales, *a, **k: ClienteFalso(planilla)
+    ServiceAccountCredentials.from_json_keyfile_dict = classmethod(lambda cls, *a, **k: None)
+    try:
+        yield planilla
+    finally:
+        gspread.authorize = authorize_original
+        ServiceAccountCredentials.from_json_keyfile_dict = credenciales_original
@@ -0,0 +1,254 @@
+# cola_escritura.py
+import threading
+import time
+from collections import OrderedDict
+
+import metricas
+from google_sheets import apply_schema
+from periodos import TablaPeriodos, reemplazar_meses, tabla_periodos
+
+# Segundos que una hoja espera desde su último guardado antes de escribirse:
+# los guardados seguidos de la misma hoja se juntan en una sola escritura
+DEMORA_ESCRITURA = 2.0
+
+
+# === Cambios pendientes de una hoja ===
+# {"completa": df o None, "meses": {(año, mes): df}}. Un guardado completo
+# reemplaza todo lo anterior; los guardados de un mes reemplazan ese mes.
+def _nuevos_cambios():
+    return {"completa": None, "meses": OrderedDict()}
+
+
+def _combinar(cambios, posteriores):
+    # Lo posterior se aplica encima de lo anterior
+    if posteriores["completa"] is not None:
+        return {"completa": posteriores["completa"], "meses": OrderedDict(posteriores["meses"])}
+    combinados = {"completa": cambios["completa"], "meses": OrderedDict(cambios["meses"])}
+    for periodo, df_mes in posteriores["meses"].items():
+        combinados["meses"].pop(periodo, None)
+        combinados["meses"][periodo] = df_mes
+    return combinados
+
+
+def _aplicar(df, cambios):
+    if cambios["completa"] is not None:
+        df = cambios["completa"]
+    return reemplazar_meses(df, cambios["meses"])
+
+
+def _aplicar_mes(df_mes, cambios, año, mes):
+    if cambios["completa"] is not None:
+        df_mes = TablaPeriodos(cambios["completa"]).mes(año, mes)
+    return cambios["meses"].get((año, mes), df_mes)
+
+
+class AlmacenDiferido:
+    # Almacén con cola de escritura: guardar() y guardar_mes() vuelven de
+    # inmediato y un hilo en segundo plano escribe en el almacén de abajo.
+    # Mientras una hoja espera su turno, los guardados nuevos se combinan con
+    # los anteriores: una ráfaga de guardados cuesta una escritura por hoja.
+    # Cada hoja se escribe en el orden en que se guardó, y las lecturas ya
+    # incluyen lo que todavía no se escribió.
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self.id = almacen.id
+        self._cond = threading.Condition()
+        self._pendientes = OrderedDict()   # hoja -> cambios esperando su turno
+        self._en_curso = {}                # hoja -> cambios que se están escribiendo
+        self._fallidos = {}                # hoja -> cambios cuya escritura falló
+        self._errores = {}                 # hoja -> mensaje del último error
+        self._generacion = {}              # hoja -> guardados recibidos
+        self._propias = {}                 # hoja -> cambios de versión por escrituras de la cola
+        self._recibido = {}                # hoja -> momento del último guardado
+        self._urgente = 0                  # > 0 mientras alguien espera vaciar la cola
+        self._ultimo_guardado = None       # hora de la última escritura completa
+        self._hilo = threading.Thread(target=self._trabajar, name="cola-escritura", daemon=True)
+        self._hilo.start()
+
+    # --- Interfaz de almacén ---
+    @property
+    def solo_lectura(self):
+        return self.almacen.solo_lectura
+
+    def version(self, hoja):
+        # Cambia al recibir un guardado y cuando la hoja cambia por otro lado.
+        # Escribirlo no la cambia: lo que se lee a través de la cola ya lo incluía.
+        return (self.almacen.version(hoja) - self._propias.get(hoja, 0), self._generacion.get(hoja, 0))
+
+    def tabla(self, hoja, df):
+        return tabla_periodos((self.id, hoja), self.version(hoja), df)
+
+    def _sin_escribir(self, hoja):
+        with self._cond:
+            return [c for c in (self._en_curso.get(hoja), self._fallidos.get(hoja), self._pendientes.get(hoja)) if c]
+
+    def _con_pendientes(self, hoja, df):
+        cambios = self._sin_escribir(hoja)
+        for c in cambios:
+            df = _aplicar(df, c)
+        return apply_schema(hoja, df) if cambios else df
+
+    def _mes_con_pendientes(self, hoja, df_mes, año, mes):
+        cambios = self._sin_escribir(hoja)
+        for c in cambios:
+            df_mes = _aplicar_mes(df_mes, c, año, mes)
+        return apply_schema(hoja, df_mes.reset_index(drop=True)) if cambios else df_mes
+
+    def leer(self, hoja):
+        return self._con_pendientes(hoja, self.almacen.leer(hoja))
+
+    def leer_varias(self, hojas):
+        return {hoja: self._con_pendientes(hoja, df) for hoja, df in self.almacen.leer_varias(hojas).items()}
+
+    def al_dia(self, hojas):
+        self.almacen.al_dia(hojas)
+
+    def leer_mes(self, hoja, año, mes):
+        return self._mes_con_pendientes(hoja, self.almacen.leer_mes(hoja, año, mes), año, mes)
+
+    def leer_meses(self, hojas, año, mes):
+        return {
+            hoja: self._mes_con_pendientes(hoja, df, año, mes)
+            for hoja, df in self.almacen.leer_meses(hojas, año, mes).items()
+        }
+
+    def guardar(self, hoja, df):
+        cambios = _nuevos_cambios()
+        cambios["completa"] = df.copy()
+        self._encolar(hoja, cambios)
+
+    def guardar_mes(self, hoja, año, mes, df_mes):
+        self.guardar_meses(hoja, {(año, mes): df_mes})
+
+    def guardar_meses(self, hoja, meses):
+        cambios = _nuevos_cambios()
+        for periodo, df_mes in meses.items():
+            cambios["meses"][periodo] = df_mes.copy()
+        self._encolar(hoja, cambios)
+
+    def _vaciar(self, hojas):
+        # Antes de una operación directa (que no pasa por la cola) se escribe lo
+        # pendiente, para que cada hoja esté al día y en el orden correcto
+        self.esperar()
+        with self._cond:
+            fallidas = [hoja for hoja in hojas if hoja in self._fallidos]
+        if fallidas:
+            raise RuntimeError(f"Hay guardados sin escribir en {', '.join(fallidas)}: reintenta primero")
+
+    def copiar_mes(self, ajustes, origen, destino):
+        self._vaciar(ajustes)
+        return self.almacen.copiar_mes(ajustes, origen, destino)
+
+    def version_archivo(self):
+        return self.almacen.version_archivo()
+
+    def años_archivados(self):
+        return self.almacen.años_archivados()
+
+    def leer_archivo(self, hojas):
+        return self.almacen.leer_archivo(hojas)
+
+    def archivar_año(self, hojas, año):
+        self._vaciar(hojas)
+        return self.almacen.archivar_año(hojas, año)
+
+    # --- Cola ---
+    def _encolar(self, hoja, cambios):
+        with self._cond:
+            self._generacion[hoja] = self._generacion.get(hoja, 0) + 1
+            self._recibido[hoja] = time.monotonic()
+            if hoja in self._fallidos:
+                # Hasta reintentar, lo nuevo queda detrás de lo que falló
+                self._fallidos[hoja] = _combinar(self._fallidos[hoja], cambios)
+            elif hoja in self._pendientes:
+                self._pendientes[hoja] = _combinar(self._pendientes[hoja], cambios)
+            else:
+                self._pendientes[hoja] = cambios
+            self._cond.notify_all()
+
+    def _escribir(self, hoja, cambios):
+        antes = self.almacen.escrituras(hoja)
+        with metricas.medir("escritura_diferida_segundos", hoja=hoja):
+            if cambios["completa"] is not None:
+                self.almacen.guardar(hoja, reemplazar_meses(cambios["completa"], cambios["meses"]))
+            else:
+                self.almacen.guardar_meses(hoja, cambios["meses"])
+        with self._cond:
+            self._propias[hoja] = self._propias.get(hoja, 0) + self.almacen.escrituras(hoja) - antes
+
+    def _siguiente(self):
+        # (hoja lista para escribir, None) o (None, segundos hasta la próxima)
+        ahora = time.monotonic()
+        espera = None
+        for hoja in self._pendientes:
+            restante = 0 if self._urgente else self._recibido.get(hoja, 0) + DEMORA_ESCRITURA - ahora
+            if restante <= 0:
+                return hoja, None
+            espera = restante if espera is None else min(espera, restante)
+        return None, espera
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                hoja, espera = self._siguiente()
+                while hoja is None:
+                    self._cond.wait(espera)
+                    hoja, espera = self._siguiente()
+                cambios = self._pendientes.pop(hoja)
+                self._en_curso[hoja] = cambios
+            try:
+                self._escribir(hoja, cambios)
+            except Exception as e:
+                with self._cond:
+                    del self._en_curso[hoja]
+                    posteriores = self._pendientes.pop(hoja, None)
+                    self._fallidos[hoja] = _combinar(cambios, posteriores) if posteriores else cambios
+                    self._errores[hoja] = str(e)
+                    self._cond.notify_all()
+            else:
+                with self._cond:
+                    del self._en_curso[hoja]
+                    self._errores.pop(hoja, None)
+                    self._ultimo_guardado = time.time()
+                    self._cond.notify_all()
+
+    def reintentar(self):
+        # Vuelve a encolar las hojas cuya escritura falló
+        with self._cond:
+            for hoja, cambios in self._fallidos.items():
+                self._pendientes[hoja] = cambios
+            self._fallidos.clear()
+            self._cond.notify_all()
+
+    def esperar(self, timeout=None):
+        # Escribe ya lo pendiente (sin demora) y espera a que termine; True si se vació la cola
+        with self._cond:
+            self._urgente += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pendientes and not self._en_curso, timeout)
+            finally:
+                self._urgente -= 1
+
+    def estado(self):
+        with self._cond:
+            return {
+                "pendientes": list(self._en_curso) + [h for h in self._pendientes if h not in self._en_curso],
+                "fallidos": {hoja: self._errores.get(hoja, "") for hoja in self._fallidos},
+                "ultimo_guardado": self._ultimo_guardado,
+            }
+
+
+_colas = {}   # id del almacén -> AlmacenDiferido (una cola por proceso)
+_colas_lock = threading.Lock()
+
+
+def con_cola(almacen):
+    with _colas_lock:
+        if almacen.id not in _colas:
+            _colas[almacen.id] = AlmacenDiferido(almacen)
+        # El almacén de abajo puede cambiar entre reruns (al reconectar con
+        # Google Sheets después de arrancar sin conexión): la cola usa el último
+        _colas[almacen.id].almacen = almacen
+        return _colas[almacen.id]
@@ -0,0 +1,3 @@
+# conftest.py
+# Los módulos de la app están en la raíz del proyecto: pytest la agrega al
+# path al encontrar este archivo, así los tests pueden importarlos.
@@ -0,0 +1,180 @@
+# exportar.py
+import io
+import threading
+import zipfile
+from collections import OrderedDict
+
+import pandas as pd
+
+import metricas
+
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# === Caché de archivos ===
+# Los archivos generados se guardan por (tipo, año, mes, versiones de las hojas):
+# descargar de nuevo el mismo resumen no vuelve a armar el Excel.
+CACHE_MAX_ARCHIVOS = 8
+
+_archivos = OrderedDict()   # clave -> bytes
+_archivos_lock = threading.Lock()
+
+
+def _filas(df):
+    # Fila a fila, con los nulos como celdas vacías
+    valores = df.astype(object).where(pd.notna(df), None)
+    yield list(df.columns)
+    yield from valores.itertuples(index=False, name=None)
+
+
+def excel_bytes(dfs):
+    # Libro en modo write_only: openpyxl escribe cada fila directo al archivo
+    # en vez de mantener todas las celdas en memoria. Se importa aquí: solo
+    # hace falta al descargar un Excel
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for nombre, df in dfs.items():
+        ws = wb.create_sheet(title=nombre[:31])
+        for fila in _filas(df):
+            ws.append(fila)
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def exportar_excel(clave, dfs):
+    with _archivos_lock:
+        if clave in _archivos:
+            _archivos.move_to_end(clave)
+            return _archivos[clave]
+    with metricas.medir("exportacion_segundos", formato="xlsx"):
+        datos = excel_bytes(dfs)
+    metricas.sumar("exportacion_bytes_total", len(datos), formato="xlsx")
+    with _archivos_lock:
+        _archivos[clave] = datos
+        _archivos.move_to_end(clave)
+        while len(_archivos) > CACHE_MAX_ARCHIVOS:
+            _archivos.popitem(last=False)
+    return datos
+
+
+# === Exportación por rango de períodos (CSV / Parquet) ===
+# Para historias de varios años: cada hoja se recorre mes a mes y cada trozo
+# se escribe de inmediato dentro de un .zip (un archivo por hoja). Nunca se
+# arma la tabla completa ni su CSV: a lo más un trozo de filas a la vez. El .zip
+# sí termina entero en memoria, porque st.download_button lee todo lo que
+# entrega el generador antes de servir el archivo.
+FORMATOS = {"CSV": "csv", "Parquet": "parquet"}
+MIME_ZIP = "application/zip"
+CHUNK_FILAS = 50_000
+
+
+class _SalidaIncremental(io.RawIOBase):
+    # Destino de escritura sin seek: zipfile escribe aquí y el generador
+    # va retirando lo acumulado después de cada trozo
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def retirar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+class LectorGenerador(io.RawIOBase):
+    # Adapta un generador de bytes a un archivo de solo lectura (para
+    # st.download_button, que lo lee completo al hacer clic)
+    def __init__(self, generador):
+        self._generador = generador
+        self._pendiente = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self._pendiente:
+            try:
+                self._pendiente = next(self._generador)
+            except StopIteration:
+                return 0
+        n = min(len(destino), len(self._pendiente))
+        destino[:n] = self._pendiente[:n]
+        self._pendiente = self._pendiente[n:]
+        return n
+
+
+def _en_rango(periodo, desde, hasta):
+    return desde <= periodo <= hasta
+
+
+def trozos_en_rango(tabla, desde, hasta):
+    # Filas de la hoja entre desde y hasta (tuplas (año, mes), inclusive),
+    # mes a mes y en trozos de a lo más CHUNK_FILAS filas
+    if not tabla.tiene_periodo:
+        partes = [tabla.df]
+    else:
+        partes = (tabla.mes(*p) for p in tabla.periodos() if _en_rango(p, desde, hasta))
+    for parte in partes:
+        for inicio in range(0, len(parte), CHUNK_FILAS):
+            yield parte.iloc[inicio:inicio + CHUNK_FILAS]
+
+
+def _normalizar(df):
+    # Columnas object con valores mezclados pasan a texto para que cada trozo
+    # tenga el mismo esquema
+    columnas = df.select_dtypes("object").columns
+    return df.astype({c: "string" for c in columnas})
+
+
+def _escribir_csv(archivo, trozos, salida):
+    encabezado = True
+    for trozo in trozos:
+        archivo.write(trozo.to_csv(index=False, header=encabezado).encode("utf-8"))
+        encabezado = False
+        yield salida.retirar()
+
+
+def _escribir_parquet(archivo, trozos, salida, df_base):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.Schema.from_pandas(_normalizar(df_base.iloc[:0]), preserve_index=False)
+    writer = pq.ParquetWriter(archivo, esquema)
+    try:
+        for trozo in trozos:
+            writer.write_table(pa.Table.from_pandas(_normalizar(trozo), schema=esquema, preserve_index=False))
+            yield salida.retirar()
+    finally:
+        writer.close()
+
+
+def generar_rango(tablas, desde, hasta, formato):
+    # Generador de bytes del .zip con un archivo por hoja para el rango pedido.
+    # Streamlit lo consume completo al hacer clic: el tiempo medido es el de armar el .zip.
+    extension = FORMATOS[formato]
+    with metricas.medir("exportacion_segundos", formato=extension):
+        for trozo in _generar_zip(tablas, desde, hasta, extension):
+            metricas.sumar("exportacion_bytes_total", len(trozo), formato=extension)
+            yield trozo
+
+
+def _generar_zip(tablas, desde, hasta, extension):
+    compresion = zipfile.ZIP_DEFLATED if extension == "csv" else zipfile.ZIP_STORED
+    salida = _SalidaIncremental()
+    with zipfile.ZipFile(salida, "w", compression=compresion) as zf:
+        for nombre, tabla in tablas.items():
+            trozos = trozos_en_rango(tabla, desde, hasta)
+            with zf.open(f"{nombre}.{extension}", "w") as archivo:
+                if extension == "csv":
+                    yield from _escribir_csv(archivo, trozos, salida)
+                else:
+                    yield from _escribir_parquet(archivo, trozos, salida, tabla.df)
+            yield salida.retirar()
+    yield salida.retirar()
@@ -1,24 +1,878 @@
 # google_sheets.py
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from difflib import SequenceMatcher
+
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from gspread.utils import absolute_range_name, fill_gaps, numericise_all, to_records
+import numpy as np
 import pandas as pd
+from requests.adapters import HTTPAdapter
+
+import metricas
+from limitador import Planificador, es_reintentable, es_reintentable_escritura
+from snapshot import SNAPSHOT_PATH, SnapshotStore
 
 # Definir el alcance para Google Sheets
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
-def connect_to_sheet(secret_dict, sheet_key):
+# === Caché de lecturas ===
+# Streamlit vuelve a ejecutar app.py en cada interacción, pero este módulo queda
+# importado, así que el caché sobrevive entre reruns y evita releer cada hoja.
+CACHE_TTL = 300          # segundos que una hoja se considera vigente
+CACHE_MAX_ENTRIES = 64   # máximo de hojas guardadas (se expulsa la menos usada)
+
+_cache = OrderedDict()   # (sheet_key, tab_name) -> (timestamp, df, ttl)
+_cache_lock = threading.Lock()
+
+# Última copia conocida de cada hoja (lo que se leyó o escribió por última vez).
+# No vence con el TTL: es la base contra la que se calculan las escrituras por diferencia.
+_known = {}              # (sheet_key, tab_name) -> df
+
+# modifiedTime de la planilla con el que se confirmó cada copia conocida (None
+# si no se sabe). Si la planilla cambió desde entonces, alguien pudo editarla
+# directamente y los índices de fila de _known ya no son confiables.
+_known_modified = {}     # (sheet_key, tab_name) -> modifiedTime
+
+# Versión de cada hoja: sube solo cuando su contenido cambia (lectura con datos
+# distintos o escritura). Sirve para reutilizar cálculos derivados entre reruns.
+_versions = {}           # (sheet_key, tab_name) -> int
+
+# Cuántas de esas subidas vinieron de escrituras hechas desde la app: la cola de
+# escritura descuenta las suyas, porque lo que muestra no cambia al escribirlo.
+_written = {}            # (sheet_key, tab_name) -> int
+
+
+def _cache_key(sheet, tab_name):
+    return (sheet.id, tab_name)
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        timestamp, df, ttl = entry
+        if time.monotonic() - timestamp > ttl:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return df
+
+
+def _cache_put(key, df, ttl=CACHE_TTL, modificado=None):
+    with _cache_lock:
+        known = _known.get(key)
+        if known is None or not known.equals(df):
+            _versions[key] = _versions.get(key, 0) + 1
+            _known_modified[key] = modificado
+        elif modificado is not None:
+            # Mismo contenido: si no se sabe el modifiedTime, el ya confirmado sigue valiendo
+            _known_modified[key] = modificado
+        _cache[key] = (time.monotonic(), df, ttl)
+        _cache.move_to_end(key)
+        _known[key] = df
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def tab_version(sheet, tab_name):
+    return _versions.get(_cache_key(sheet, tab_name), 0)
+
+
+def tab_writes(sheet, tab_name):
+    return _written.get(_cache_key(sheet, tab_name), 0)
+
+
+def _bump_written(key):
+    _versions[key] = _versions.get(key, 0) + 1
+    _written[key] = _written.get(key, 0) + 1
+
+
+def invalidate_cache(sheet=None, tab_name=None):
+    # Sin argumentos limpia todo; con sheet y tab_name solo esa hoja
+    with _cache_lock:
+        if sheet is None:
+            _cache.clear()
+        elif tab_name is None:
+            for key in [k for k in _cache if k[0] == sheet.id]:
+                del _cache[key]
+        else:
+            _cache.pop(_cache_key(sheet, tab_name), None)
+
+
+# === Cuotas ===
+# Todas las llamadas a la API pasan por el planificador: respeta las cuotas por
+# minuto de lectura y escritura y reintenta con espera ante 429 / 5xx.
+# Los batchUpdate por índice de fila no se repiten ante 5xx o timeouts (ver
+# limitador.es_reintentable_escritura).
+planificador = Planificador()
+
+
+def _api(tipo, fn, *args, tab=None, reintentable=es_reintentable, **kwargs):
+    # Además se registran llamadas (cada intento cuenta), errores y latencia
+    # (incluida la espera por cuota) por operación y hoja
+    etiquetas = {"tipo": tipo, "operacion": getattr(fn, "__name__", "api"), "hoja": tab or ""}
+
+    def intento(*a, **kw):
+        metricas.sumar("api_llamadas_total", **etiquetas)
+        return fn(*a, **kw)
+
+    with metricas.contexto(**etiquetas), metricas.medir("api_segundos", **etiquetas):
+        try:
+            return planificador.ejecutar(tipo, intento, *args, reintentable=reintentable, **kwargs)
+        except Exception:
+            metricas.sumar("api_errores_total", **etiquetas)
+            raise
+
+
+# === Pool de clientes ===
+# Un cliente autorizado por (credenciales, planilla) para todo el proceso:
+# los reruns reutilizan el token y las conexiones HTTP abiertas.
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)  # renovar antes de que venza
+HTTP_POOL_SIZE = 10                                   # conexiones keep-alive por host
+REQUEST_TIMEOUT = (5, 30)                             # (conexión, lectura) en segundos por request
+
+_clients = {}            # (huella_credenciales, sheet_key) -> (client, sheet)
+_clients_lock = threading.Lock()
+
+
+def _credentials_fingerprint(secret_dict):
+    contenido = json.dumps(dict(secret_dict), sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _count_bytes(response, *args, **kwargs):
+    # Hook de requests: bytes de cada respuesta y request, atribuidos a la
+    # llamada en curso de este hilo
+    etiquetas = metricas.etiquetas_actuales()
+    if not etiquetas:
+        return
+    metricas.sumar("api_bytes_recibidos_total", len(response.content or b""), **etiquetas)
+    body = response.request.body if response.request is not None else None
+    metricas.sumar("api_bytes_enviados_total", len(body) if body else 0, **etiquetas)
+
+
+def _refresh_token_if_needed(client):
+    # Renueva el token si le quedan menos de TOKEN_REFRESH_MARGIN de vida
+    auth = getattr(client.http_client, "auth", None)
+    if auth is None:
+        return
+    expiry = getattr(auth, "expiry", None)
+    # google-auth guarda expiry como datetime UTC sin zona horaria
+    ahora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    if not auth.token or expiry is None or expiry - ahora < TOKEN_REFRESH_MARGIN:
+        client.http_client.login()
+
+
+class OfflineSheet:
+    # Planilla sin conexión: la devuelve connect_to_sheet si no se pudo abrir la
+    # real (API caída o sin cuota tras un reinicio). Tiene el mismo id, así que
+    # las lecturas caen a la copia local; toda llamada a la API falla enseguida
+    # y sin reintentos.
+    def __init__(self, sheet_key, error):
+        self.id = sheet_key
+        self.error = error
+
+    def _unavailable(self, *args, **kwargs):
+        raise RuntimeError(f"Sin conexión con Google Sheets: {self.error}")
+
+    values_get = values_batch_get = worksheet = worksheets = batch_update = get_lastUpdateTime = _unavailable
+
+
+_failed = {}             # (huella_credenciales, sheet_key) -> (timestamp, OfflineSheet)
+
+
+def _open_client(secret_dict, sheet_key):
+    # oauth2client solo se usa al crear el cliente: se importa aquí
+    from oauth2client.service_account import ServiceAccountCredentials
+
     credentials = ServiceAccountCredentials.from_json_keyfile_dict(secret_dict, scope)
     client = gspread.authorize(credentials)
-    sheet = client.open_by_key(sheet_key)
-    return sheet
+    client.set_timeout(REQUEST_TIMEOUT)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    client.http_client.session.mount("https://", adapter)
+    client.http_client.session.hooks["response"].append(_count_bytes)
+    _refresh_token_if_needed(client)
+    # Con copia local basta un intento: si falla se muestra la copia mientras tanto
+    con_copia = snapshot is not None and snapshot.tiene(sheet_key)
+    reintentable = (lambda error: False) if con_copia else es_reintentable
+    sheet = _api("read", client.open_by_key, sheet_key, reintentable=reintentable)
+    return client, sheet
 
-def read_sheet_as_df(sheet, tab_name):
-    worksheet = sheet.worksheet(tab_name)
-    data = worksheet.get_all_records()
-    df = pd.DataFrame(data)
+
+def connect_to_sheet(secret_dict, sheet_key):
+    key = (_credentials_fingerprint(secret_dict), sheet_key)
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            failed = _failed.get(key)
+            if failed is not None and time.time() - failed[0] < OFFLINE_TTL:
+                return failed[1]
+            try:
+                entry = _clients[key] = _open_client(secret_dict, sheet_key)
+            except Exception as e:
+                # Sin conexión: las vistas se arman con la copia local en solo lectura
+                # y se vuelve a intentar pasado OFFLINE_TTL
+                offline = OfflineSheet(sheet_key, e)
+                _failed[key] = (time.time(), offline)
+                return offline
+            _failed.pop(key, None)
+        else:
+            client, sheet = entry
+            _refresh_token_if_needed(client)
+    return entry[1]
+
+
+def disconnect_all():
+    # Cierra las sesiones HTTP y vacía el pool (por ejemplo, si cambian las credenciales)
+    with _clients_lock:
+        for client, _ in _clients.values():
+            client.http_client.session.close()
+        _clients.clear()
+
+
+# === Copia local (snapshot) ===
+# Con el snapshot activado cada hoja leída se guarda también en disco (SQLite).
+# Al cargar, se consulta el modifiedTime de la planilla (una llamada liviana a
+# Drive) y las hojas cuya copia ya se verificó contra ese mismo modifiedTime se
+# sirven desde el disco sin pedir sus valores. Si la API no responde o está sin
+# cuota, se muestran las copias locales en modo solo lectura.
+OFFLINE_TTL = 30         # segundos antes de volver a intentar con la API
+
+snapshot = None          # SnapshotStore activo (ver enable_snapshot)
+_offline = set()         # (sheet_key, tab_name) servidas desde la copia local por falla de la API
+
+
+def enable_snapshot(ruta=SNAPSHOT_PATH):
+    global snapshot
+    if snapshot is None or snapshot.ruta != ruta:
+        snapshot = SnapshotStore(ruta)
+    return snapshot
+
+
+def reset_state():
+    # Deja el módulo como recién importado (igual que al reiniciar el servidor):
+    # conexiones, caché, copias conocidas, versiones y cuota. La copia local en
+    # disco se conserva, solo se desactiva.
+    global snapshot, planificador
+    disconnect_all()
+    with _cache_lock:
+        _cache.clear()
+    for estado in (_known, _known_modified, _versions, _written, _failed, _offline):
+        estado.clear()
+    snapshot = None
+    planificador = Planificador()
+
+
+def is_read_only(sheet):
+    # True si no hay conexión o si alguna hoja se está mostrando desde la copia local
+    return isinstance(sheet, OfflineSheet) or any(key[0] == sheet.id for key in _offline)
+
+
+def retry_offline(sheet):
+    # Vuelve a pedir a la API las hojas servidas desde la copia local una vez
+    # vencido OFFLINE_TTL. Las vistas memorizadas no releen si nada cambió,
+    # así que sin esto la app podría quedar en solo lectura aunque la API volvió.
+    if isinstance(sheet, OfflineSheet):
+        return
+    vencidas = [tab for sheet_key, tab in list(_offline) if sheet_key == sheet.id and _cache_get((sheet_key, tab)) is None]
+    if ARCHIVE_MANIFEST in vencidas:
+        vencidas.remove(ARCHIVE_MANIFEST)
+        read_manifest(sheet)
+    if vencidas:
+        read_sheets_as_dfs(sheet, vencidas)
+
+
+def _modified_time(sheet):
+    # Un solo intento, sin reintentos: si Drive no contesta se asume que la
+    # API está caída o sin cuota y se pasa directo a la copia local
+    etiquetas = {"tipo": "read", "operacion": "get_lastUpdateTime", "hoja": ""}
+    with metricas.contexto(**etiquetas), metricas.medir("api_segundos", **etiquetas):
+        planificador.adquirir("read")
+        metricas.sumar("api_llamadas_total", **etiquetas)
+        try:
+            return sheet.get_lastUpdateTime()
+        except Exception:
+            metricas.sumar("api_errores_total", **etiquetas)
+            return None
+
+
+def _load_values(sheet, tab_name, values, modificado=None):
+    # Valores recién leídos de la API: al caché y a la copia local
+    key = _cache_key(sheet, tab_name)
+    df = apply_schema(tab_name, _values_to_df(values))
+    _cache_put(key, df, modificado=modificado)
+    _offline.discard(key)
+    if snapshot is not None:
+        snapshot.guardar(sheet.id, tab_name, values, modificado)
+    return df
+
+
+def _load_snapshot(sheet, tab_name, offline=False, modificado=None):
+    entrada = snapshot.leer(sheet.id, tab_name) if snapshot is not None else None
+    if entrada is None:
+        return None
+    key = _cache_key(sheet, tab_name)
+    df = apply_schema(tab_name, _values_to_df(entrada["values"]))
+    if offline:
+        _cache_put(key, df, ttl=OFFLINE_TTL)
+        _offline.add(key)
+    else:
+        _cache_put(key, df, modificado=modificado)
+        _offline.discard(key)
     return df
 
-def write_df_to_sheet(sheet, tab_name, df):
-    worksheet = sheet.worksheet(tab_name)
-    worksheet.clear()
-    worksheet.update([df.columns.values.tolist()] + df.values.tolist())
+def _values_to_df(values):
+    # Replica get_all_records: la primera fila son los encabezados y el resto
+    # se numeriza celda a celda. Una hoja vacía o solo con encabezados da un
+    # DataFrame sin columnas, igual que antes.
+    if not values:
+        return pd.DataFrame()
+    keys = values[0]
+    rows = fill_gaps(values[1:], cols=len(keys)) if len(values) > 1 else []
+    rows = [numericise_all(row[:len(keys)]) for row in rows]
+    return pd.DataFrame(to_records(keys, rows))
+
+# === Esquema de cada hoja ===
+# Tipos compactos para las columnas conocidas: mes/año como enteros chicos,
+# montos como int64 y los campos de texto repetidos como categorías. El texto
+# queda tal como está en la hoja, porque es lo que se vuelve a escribir:
+# "estado" y "se_uso" se comparan con same_label.
+PERIODO = {"mes": "int8", "año": "int16"}
+
+SCHEMAS = {
+    "Ingresos": {"monto": "monto", "cuenta": "categoria"},
+    "Gastos Fijos": {"monto": "monto", "estado": "categoria", "cuenta_pago": "categoria"},
+    "Deudas": {"monto_cuota": "monto", "cuotas_mes": "monto"},
+    "Provisiones": {"monto": "monto", "monto_usado": "monto", "se_uso": "categoria"},
+    "Ahorros": {"monto_ingreso": "monto", "monto_retirado": "monto", "cuenta": "categoria"},
+    "Reservas Familiares": {"monto": "monto", "cuenta": "categoria"},
+    "Cuentas": {"nombre_cuenta": "categoria"},
+}
+
+
+def _to_int(col, dtype):
+    # Celdas vacías cuentan como 0. Si hay texto que no es número (o decimales)
+    # la columna se deja como viene para no perder datos al volver a escribirla.
+    vacias = col.isna() | (col.astype(str).str.strip() == "")
+    numeros = pd.to_numeric(col.where(~vacias), errors="coerce")
+    if numeros[~vacias].isna().any() or (numeros.fillna(0) % 1 != 0).any():
+        return col
+    return numeros.fillna(0).astype(dtype)
+
+
+def _to_category(col):
+    # Las celdas vacías quedan como nulo y vuelven a escribirse vacías
+    texto = col.astype(object).where(col.notna() & (col.astype(str) != ""))
+    texto = texto.map(lambda v: v if pd.isna(v) else str(v))
+    return pd.Categorical(texto, categories=sorted(texto.dropna().unique()))
+
+
+def same_label(col, label):
+    # col == label sin distinguir mayúsculas ni espacios ("Pagado ", "PAGADO").
+    # Con categorías se normaliza cada categoría una vez, no cada fila.
+    label = label.strip().lower()
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        coincide = np.array([str(c).strip().lower() == label for c in col.cat.categories] + [False])
+        return pd.Series(coincide[col.cat.codes.to_numpy()], index=col.index)
+    return col.astype(str).str.strip().str.lower() == label
+
+
+def apply_schema(tab_name, df):
+    if df.empty and len(df.columns) == 0:
+        return df
+    df = df.copy()
+    for col, dtype in PERIODO.items():
+        if col in df.columns:
+            df[col] = _to_int(df[col], dtype)
+    for col, tipo in SCHEMAS.get(tab_name, {}).items():
+        if col not in df.columns:
+            continue
+        if tipo == "monto":
+            df[col] = _to_int(df[col], np.int64)
+        else:
+            df[col] = _to_category(df[col])
+    return df
+
+def read_sheet_as_df(sheet, tab_name):
+    key = _cache_key(sheet, tab_name)
+    df = _cache_get(key)
+    if df is None:
+        # Una sola llamada (values.get) en vez de metadata + get_all_records
+        try:
+            response = _api("read", sheet.values_get, absolute_range_name(tab_name), tab=tab_name)
+        except Exception:
+            df = _load_snapshot(sheet, tab_name, offline=True)
+            if df is None:
+                raise
+        else:
+            df = _load_values(sheet, tab_name, response.get("values", []))
+    # Se entrega una copia para que quien llama pueda modificarla sin ensuciar el caché
+    return df.copy()
+
+def read_sheets_as_dfs(sheet, tab_names):
+    # Carga varias hojas en un solo values.batchGet y devuelve {hoja: DataFrame}.
+    # Las que ya están en caché no se vuelven a pedir.
+    dfs = {}
+    faltantes = []
+    for tab_name in tab_names:
+        df = _cache_get(_cache_key(sheet, tab_name))
+        if df is None:
+            faltantes.append(tab_name)
+        else:
+            dfs[tab_name] = df
+
+    modificado = None
+    if faltantes and snapshot is not None:
+        modificado = _modified_time(sheet)
+        if modificado is None:
+            # Sin API: lo que tenga copia local se muestra en solo lectura
+            for tab_name in faltantes:
+                df = _load_snapshot(sheet, tab_name, offline=True)
+                if df is not None:
+                    dfs[tab_name] = df
+        else:
+            # Solo se piden las hojas que pudieron cambiar desde la última verificación
+            for tab_name in snapshot.verificadas(sheet.id, faltantes, modificado):
+                df = _load_snapshot(sheet, tab_name, modificado=modificado)
+                if df is not None:
+                    dfs[tab_name] = df
+        faltantes = [t for t in faltantes if t not in dfs]
+
+    if faltantes:
+        try:
+            response = _api(
+                "read", sheet.values_batch_get, [absolute_range_name(t) for t in faltantes], tab=",".join(faltantes)
+            )
+            value_ranges = response.get("valueRanges", [])
+            for tab_name, value_range in zip(faltantes, value_ranges):
+                dfs[tab_name] = _load_values(sheet, tab_name, value_range.get("values", []), modificado)
+        except Exception as e:
+            if isinstance(e, gspread.exceptions.APIError) and e.code == 400:
+                # Si una hoja no existe el batch completo falla: se leen en paralelo
+                # hoja por hoja y la que falle queda como DataFrame vacío
+                dfs.update(read_sheets_concurrently(sheet, faltantes))
+            else:
+                # Cuota, 5xx o timeout: el planificador ya reintentó y releer hoja
+                # por hoja solo sumaría llamadas. Lo que tenga copia local se
+                # muestra en solo lectura y el resto queda como DataFrame vacío.
+                for tab_name in faltantes:
+                    df = _load_snapshot(sheet, tab_name, offline=True)
+                    dfs[tab_name] = df if df is not None else pd.DataFrame()
+
+    return {tab_name: dfs[tab_name].copy() for tab_name in tab_names}
+
+# === Carga en paralelo ===
+LOAD_WORKERS = 4     # lecturas simultáneas como máximo
+LOAD_TIMEOUT = 45    # segundos para esperar todas las hojas
+
+
+def read_sheets_concurrently(sheet, tab_names, max_workers=None, timeout=None):
+    # Lee cada hoja en su propio hilo (cada una pasa por el caché como siempre).
+    # Una hoja que falla o no responde a tiempo queda como DataFrame vacío sin
+    # afectar a las demás; el tiempo total es el de la hoja más lenta.
+    max_workers = max_workers or LOAD_WORKERS
+    timeout = timeout or LOAD_TIMEOUT
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tab_names))))
+    try:
+        futures = {tab_name: executor.submit(read_sheet_as_df, sheet, tab_name) for tab_name in tab_names}
+        wait(futures.values(), timeout=timeout)
+        dfs = {}
+        for tab_name, future in futures.items():
+            if future.done() and future.exception() is None:
+                dfs[tab_name] = future.result()
+            else:
+                dfs[tab_name] = pd.DataFrame()
+        return dfs
+    finally:
+        # No se espera a los hilos que se pasaron del timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# === Escritura por diferencias ===
+def _df_to_grid(df):
+    # Encabezados + filas como valores de Python; los nulos quedan como celda vacía
+    valores = df.astype(object).where(pd.notna(df), "")
+    return [df.columns.values.tolist()] + valores.values.tolist()
+
+def _cell_data(value):
+    if value == "" or value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+def _row_updates(sheet_id, row_index, old_row, new_row):
+    # Un updateCells por cada tramo contiguo de celdas distintas en la fila
+    requests = []
+    j = 0
+    while j < len(new_row):
+        if old_row[j] == new_row[j]:
+            j += 1
+            continue
+        inicio = j
+        while j < len(new_row) and old_row[j] != new_row[j]:
+            j += 1
+        requests.append({"updateCells": {
+            "start": {"sheetId": sheet_id, "rowIndex": row_index, "columnIndex": inicio},
+            "rows": [{"values": [_cell_data(v) for v in new_row[inicio:j]]}],
+            "fields": "userEnteredValue",
+        }})
+    return requests
+
+def _diff_requests(sheet_id, old_grid, new_grid):
+    # Alinea las filas viejas y nuevas (como un diff de texto) y arma los requests
+    # de batchUpdate: celdas cambiadas, filas insertadas y filas eliminadas.
+    # Se recorre de abajo hacia arriba para que cada índice siga apuntando
+    # a la fila original mientras se aplican los requests anteriores.
+    ancho = max([len(r) for r in old_grid[:1] + new_grid[:1]] or [0])
+    old_rows = [tuple(r) for r in fill_gaps(old_grid, cols=ancho)] if old_grid else []
+    new_rows = [tuple(r) for r in fill_gaps(new_grid, cols=ancho)] if new_grid else []
+
+    requests = []
+    matcher = SequenceMatcher(None, old_rows, new_rows, autojunk=False)
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        comunes = min(i2 - i1, j2 - j1)
+        sobrantes = (i1 + comunes, i2)
+        nuevas = new_rows[j1 + comunes:j2]
+
+        if sobrantes[0] < sobrantes[1]:
+            requests.append({"deleteDimension": {"range": {
+                "sheetId": sheet_id, "dimension": "ROWS",
+                "startIndex": sobrantes[0], "endIndex": sobrantes[1],
+            }}})
+        if nuevas:
+            filas = [{"values": [_cell_data(v) for v in row]} for row in nuevas]
+            if i2 == len(old_rows):
+                # Filas nuevas al final: basta con un append
+                requests.append({"appendCells": {
+                    "sheetId": sheet_id, "rows": filas, "fields": "userEnteredValue",
+                }})
+            else:
+                requests.append({"insertDimension": {"range": {
+                    "sheetId": sheet_id, "dimension": "ROWS",
+                    "startIndex": i2, "endIndex": i2 + len(nuevas),
+                }}})
+                requests.append({"updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": i2, "columnIndex": 0},
+                    "rows": filas, "fields": "userEnteredValue",
+                }})
+        for k in reversed(range(comunes)):
+            requests += _row_updates(sheet_id, i1 + k, old_rows[i1 + k], new_rows[j1 + k])
+    return requests
+
+# === Copia conocida al día ===
+# Antes de un batchUpdate que ubica filas por índice se compara el modifiedTime
+# de la planilla con el que se confirmó la copia conocida de cada hoja. Si
+# cambió (alguien pudo insertar o borrar filas directo en Google Sheets dentro
+# del TTL del caché), esas hojas se vuelven a leer antes de armar el batch.
+def refresh_known(sheet, tab_names):
+    # Devuelve (modifiedTime, hojas cuyo contenido cambió al releerlas)
+    modificado = _modified_time(sheet)
+    keys = {tab_name: _cache_key(sheet, tab_name) for tab_name in tab_names}
+    # Las hojas servidas desde la copia local no se pueden escribir: se dejan como están
+    stale = [
+        t for t, key in keys.items()
+        if key not in _offline and (modificado is None or _known_modified.get(key) != modificado)
+    ]
+    if not stale:
+        return modificado, []
+    anteriores = {tab_name: _known.get(keys[tab_name]) for tab_name in stale}
+    response = _api("read", sheet.values_batch_get, [absolute_range_name(t) for t in stale], tab=",".join(stale))
+    changed = []
+    for tab_name, value_range in zip(stale, response.get("valueRanges", [])):
+        df = _load_values(sheet, tab_name, value_range.get("values", []), modificado)
+        if anteriores[tab_name] is None or not anteriores[tab_name].equals(df):
+            changed.append(tab_name)
+    return modificado, changed
+
+
+def _confirm_known(sheet, tab_names, antes=None):
+    # Después de escribir: las hojas escritas y las que seguían al día con el
+    # modifiedTime de antes quedan confirmadas con el nuevo
+    despues = _modified_time(sheet)
+    escritas = {_cache_key(sheet, tab_name) for tab_name in tab_names}
+    for key, modificado in list(_known_modified.items()):
+        if key[0] == sheet.id and (key in escritas or (antes is not None and modificado == antes)):
+            _known_modified[key] = despues
+    for key in escritas - set(_known_modified):
+        _known_modified[key] = despues
+
+
+def _forget_known(keys):
+    for key in keys:
+        _known.pop(key, None)
+        _known_modified.pop(key, None)
+
+
+def write_df_to_sheet(sheet, tab_name, df, mode="replace"):
+    # mode="replace": borra la hoja y sube la tabla completa.
+    # mode="diff": compara contra la última copia conocida y envía en un solo
+    # batchUpdate solo las celdas cambiadas, las filas nuevas y las eliminadas.
+    # Si no hay copia conocida se hace un replace normal.
+    # df también puede ser una función (hoja actual -> hoja nueva): se arma
+    # sobre la copia recién puesta al día, sin pisar lo editado directo en la
+    # planilla y con un solo refresh por escritura.
+    key = _cache_key(sheet, tab_name)
+    if key in _offline:
+        raise RuntimeError(f"'{tab_name}' se está mostrando desde la copia local: no se puede guardar sin conexión")
+    escrito = True
+    try:
+        worksheet = _api("read", sheet.worksheet, tab_name, tab=tab_name)
+        antes = None
+        if mode == "diff" and (callable(df) or _known.get(key) is not None):
+            # La diferencia se calcula contra la hoja tal como está ahora
+            antes, _ = refresh_known(sheet, [tab_name])
+        known = _known.get(key)
+        if callable(df):
+            df = df(known.copy() if known is not None else read_sheet_as_df(sheet, tab_name))
+        if mode == "diff" and known is not None:
+            old_grid, new_grid = _df_to_grid(known), _df_to_grid(df)
+            ancho = len(new_grid[0])
+            requests = []
+            if ancho > worksheet.col_count:
+                requests.append({"appendDimension": {
+                    "sheetId": worksheet.id, "dimension": "COLUMNS",
+                    "length": ancho - worksheet.col_count,
+                }})
+            requests += _diff_requests(worksheet.id, old_grid, new_grid)
+            if requests:
+                _api("write", sheet.batch_update, {"requests": requests}, tab=tab_name, reintentable=es_reintentable_escritura)
+                _confirm_known(sheet, [tab_name], antes)
+            else:
+                # Sin diferencias la hoja y su caché siguen igual
+                escrito = False
+        else:
+            _api("write", worksheet.clear, tab=tab_name)
+            _api("write", worksheet.update, _df_to_grid(df), tab=tab_name)
+            _confirm_known(sheet, [tab_name])
+        # Con los mismos tipos que una lectura: releer lo escrito no cambia la versión
+        _known[key] = apply_schema(tab_name, df.reset_index(drop=True))
+    except Exception:
+        # Si la escritura falla ya no se sabe qué quedó en la hoja
+        _forget_known([key])
+        raise
+    finally:
+        # Aunque la escritura falle a medias, la copia en caché ya no es confiable
+        if escrito:
+            invalidate_cache(sheet, tab_name)
+            _bump_written(key)
+            if snapshot is not None:
+                snapshot.olvidar(sheet.id, tab_name)
+
+
+# === Borrado y agregado de filas en varias hojas ===
+def _row_ranges(positions):
+    # Posiciones (0 = primera fila de datos) agrupadas en tramos contiguos [inicio, fin)
+    ranges = []
+    for p in sorted(int(p) for p in positions):
+        if ranges and ranges[-1][1] == p:
+            ranges[-1][1] = p + 1
+        else:
+            ranges.append([p, p + 1])
+    return ranges
+
+def delete_and_append_rows(sheet, changes):
+    # changes: {tab_name: (posiciones a borrar, df con filas nuevas)}. Las
+    # posiciones son las de la última copia conocida de cada hoja. Todo va en un
+    # solo batchUpdate de la planilla, que Google aplica completo o no aplica:
+    # no quedan hojas a medio actualizar. Las filas nuevas se agregan al final.
+    keys = [_cache_key(sheet, tab_name) for tab_name in changes]
+    offline = [tab_name for tab_name, key in zip(changes, keys) if key in _offline]
+    if offline:
+        raise RuntimeError(f"{', '.join(offline)} se está mostrando desde la copia local: no se puede guardar sin conexión")
+    antes, changed = refresh_known(sheet, list(changes))
+    if changed:
+        # Las posiciones se calcularon sobre la copia anterior: ya no apuntan a las filas correctas
+        raise RuntimeError(f"{', '.join(changed)} cambió en Google Sheets: se volvió a leer, intenta de nuevo")
+    try:
+        worksheets = {ws.title: ws for ws in _api("read", sheet.worksheets)}
+        requests = []
+        new_known = {}
+        for (tab_name, (positions, df_new)), key in zip(changes.items(), keys):
+            known = _known.get(key)
+            if known is None:
+                raise RuntimeError(f"No hay una copia conocida de '{tab_name}': hay que leerla antes")
+            worksheet_id = worksheets[tab_name].id
+            df_new = df_new.reindex(columns=known.columns)
+            # De abajo hacia arriba para que los índices sigan siendo válidos
+            for inicio, fin in reversed(_row_ranges(positions)):
+                requests.append({"deleteDimension": {"range": {
+                    "sheetId": worksheet_id, "dimension": "ROWS",
+                    "startIndex": inicio + 1, "endIndex": fin + 1,
+                }}})
+            if not df_new.empty:
+                requests.append({"appendCells": {
+                    "sheetId": worksheet_id,
+                    "rows": [{"values": [_cell_data(v) for v in row]} for row in _df_to_grid(df_new)[1:]],
+                    "fields": "userEnteredValue",
+                }})
+            new_known[key] = apply_schema(
+                tab_name, pd.concat([known.drop(index=known.index[list(positions)]), df_new], ignore_index=True)
+            )
+        if requests:
+            _api("write", sheet.batch_update, {"requests": requests}, tab=",".join(changes), reintentable=es_reintentable_escritura)
+            _confirm_known(sheet, list(changes), antes)
+        _known.update(new_known)
+    except Exception:
+        _forget_known(keys)
+        raise
+    finally:
+        for tab_name, key in zip(changes, keys):
+            invalidate_cache(sheet, tab_name)
+            _bump_written(key)
+            if snapshot is not None:
+                snapshot.olvidar(sheet.id, tab_name)
+
+
+# === Archivo por año ===
+# Los años cerrados se mueven a una pestaña por hoja y año ("Ingresos 2024")
+# y quedan anotados en la pestaña de manifiesto. Las hojas del día a día
+# guardan solo los años abiertos, así que leerlas y escribirlas no se vuelve
+# más lento con el historial; las pestañas archivadas se leen solo cuando una
+# vista pide períodos antiguos.
+ARCHIVE_MANIFEST = "Archivo"
+MANIFEST_COLUMNS = ["hoja", "año", "pestaña", "filas", "archivado"]
+
+
+def archive_tab_name(tab_name, year):
+    return f"{tab_name} {year}"
+
+
+def read_manifest(sheet):
+    key = _cache_key(sheet, ARCHIVE_MANIFEST)
+    try:
+        return read_sheet_as_df(sheet, ARCHIVE_MANIFEST)
+    except gspread.exceptions.APIError as e:
+        if e.code != 400:
+            return _manifest_unavailable(key)
+        # La planilla todavía no tiene manifiesto: no hay nada archivado
+        df = pd.DataFrame(columns=MANIFEST_COLUMNS)
+        _cache_put(key, df)
+        _offline.discard(key)
+        return df.copy()
+    except Exception:
+        return _manifest_unavailable(key)
+
+
+def _manifest_unavailable(key):
+    # Sin API y sin copia local del manifiesto: se sigue sin información de
+    # archivo, en modo solo lectura (así nada se escribe creyendo que no hay
+    # años archivados) y se reintenta pasado OFFLINE_TTL
+    df = pd.DataFrame(columns=MANIFEST_COLUMNS)
+    _cache_put(key, df, ttl=OFFLINE_TTL)
+    _offline.add(key)
+    return df.copy()
+
+
+def archived_years(sheet):
+    # {hoja: [años archivados]} según el manifiesto
+    df = read_manifest(sheet)
+    if df.empty or not {"hoja", "año"} <= set(df.columns):
+        return {}
+    years = {}
+    for tab_name, year in zip(df["hoja"].astype(str), pd.to_numeric(df["año"], errors="coerce")):
+        if not pd.isna(year):
+            years.setdefault(tab_name, set()).add(int(year))
+    return {tab_name: sorted(ys) for tab_name, ys in years.items()}
+
+
+def read_archived(sheet, tab_names):
+    # {hoja: filas de sus años archivados} (DataFrame vacío si no tiene ninguno).
+    # Todas las pestañas de archivo pedidas se leen en un solo batchGet.
+    years = archived_years(sheet)
+    archives = {tab_name: [archive_tab_name(tab_name, y) for y in years.get(tab_name, [])] for tab_name in tab_names}
+    todas = [archive for tabs in archives.values() for archive in tabs]
+    dfs = read_sheets_as_dfs(sheet, todas) if todas else {}
+    result = {}
+    for tab_name, tabs in archives.items():
+        partes = [dfs[archive] for archive in tabs if len(dfs[archive].columns)]
+        result[tab_name] = apply_schema(tab_name, pd.concat(partes, ignore_index=True)) if partes else pd.DataFrame()
+    return result
+
+
+def _append_grid(sheet_id, grid):
+    return {"appendCells": {
+        "sheetId": sheet_id,
+        "rows": [{"values": [_cell_data(v) for v in row]} for row in grid],
+        "fields": "userEnteredValue",
+    }}
+
+
+def archive_year(sheet, tab_names, year):
+    # Mueve las filas de `year` de cada hoja a su pestaña de archivo (se crea si
+    # no existe) y agrega una línea por hoja al manifiesto. Todo va en un solo
+    # batchUpdate: o queda archivado completo o no cambia nada.
+    # Devuelve {hoja: filas archivadas}; las hojas sin filas de ese año no se tocan.
+    keys = [_cache_key(sheet, tab_name) for tab_name in tab_names]
+    offline = [tab_name for tab_name, key in zip(tab_names, keys) if key in _offline]
+    if offline:
+        raise RuntimeError(f"{', '.join(offline)} se está mostrando desde la copia local: no se puede archivar sin conexión")
+    read_sheets_as_dfs(sheet, tab_names)
+    # Las filas a mover se ubican por índice: la copia conocida tiene que estar al día
+    antes, _ = refresh_known(sheet, tab_names)
+    touched = [ARCHIVE_MANIFEST] + [archive_tab_name(tab_name, year) for tab_name in tab_names]
+    try:
+        worksheets = {ws.title: ws for ws in _api("read", sheet.worksheets, tab=ARCHIVE_MANIFEST)}
+        next_id = max(ws.id for ws in worksheets.values()) + 1
+        requests, moved, new_known = [], {}, {}
+        for tab_name, key in zip(tab_names, keys):
+            known = _known.get(key)
+            if known is None or "año" not in known.columns:
+                continue
+            positions = np.flatnonzero(pd.to_numeric(known["año"], errors="coerce") == year)
+            if len(positions) == 0:
+                continue
+            rows = known.iloc[positions]
+            archive = archive_tab_name(tab_name, year)
+            if archive in worksheets:
+                # Ya había filas archivadas de ese año: se agregan debajo con sus mismas columnas
+                columns = read_sheet_as_df(sheet, archive).columns
+                if set(columns) != set(rows.columns):
+                    raise RuntimeError(f"'{archive}' tiene otras columnas que '{tab_name}': revisa la pestaña antes de archivar")
+                requests.append(_append_grid(worksheets[archive].id, _df_to_grid(rows[columns])[1:]))
+            else:
+                requests.append({"addSheet": {"properties": {"sheetId": next_id, "title": archive}}})
+                requests.append(_append_grid(next_id, _df_to_grid(rows)))
+                next_id += 1
+            # De abajo hacia arriba para que los índices sigan siendo válidos
+            for inicio, fin in reversed(_row_ranges(positions)):
+                requests.append({"deleteDimension": {"range": {
+                    "sheetId": worksheets[tab_name].id, "dimension": "ROWS",
+                    "startIndex": inicio + 1, "endIndex": fin + 1,
+                }}})
+            moved[tab_name] = len(positions)
+            new_known[key] = apply_schema(tab_name, known.drop(index=known.index[positions]).reset_index(drop=True))
+        if not moved:
+            return {}
+
+        ahora = datetime.datetime.now().isoformat(timespec="seconds")
+        manifest = [[tab_name, int(year), archive_tab_name(tab_name, year), n, ahora] for tab_name, n in moved.items()]
+        if ARCHIVE_MANIFEST in worksheets:
+            requests.append(_append_grid(worksheets[ARCHIVE_MANIFEST].id, manifest))
+        else:
+            requests.append({"addSheet": {"properties": {"sheetId": next_id, "title": ARCHIVE_MANIFEST}}})
+            requests.append(_append_grid(next_id, [MANIFEST_COLUMNS] + manifest))
+        _api("write", sheet.batch_update, {"requests": requests}, tab=",".join(moved), reintentable=es_reintentable_escritura)
+        _confirm_known(sheet, list(moved), antes)
+        _known.update(new_known)
+        return moved
+    except Exception:
+        _forget_known(keys)
+        raise
+    finally:
+        for tab_name in list(tab_names) + touched:
+            key = _cache_key(sheet, tab_name)
+            invalidate_cache(sheet, tab_name)
+            _bump_written(key)
+            if snapshot is not None:
+                snapshot.olvidar(sheet.id, tab_name)
@@ -0,0 +1,107 @@
+# graficos.py
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import metricas
+
+# === Caché de imágenes ===
+# Cada gráfico se guarda como PNG según una huella de los datos que dibuja.
+# Si los datos no cambian (por ejemplo, al mover un input del simulador que
+# no afecta a este gráfico) se devuelve la misma imagen sin volver a dibujar.
+CACHE_MAX_IMAGENES = 32
+DPI = 150
+
+_imagenes = OrderedDict()   # huella -> bytes PNG
+_imagenes_lock = threading.Lock()
+
+
+def _a_lista(valores):
+    return valores.tolist() if hasattr(valores, "tolist") else list(valores)
+
+
+def _huella(tipo, *series):
+    contenido = repr((tipo, [_a_lista(s) for s in series]))
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+def _renderizar(dibujar):
+    # Se usa Figure directo (sin pyplot): la figura no queda registrada en
+    # ningún administrador global y se libera al salir de esta función.
+    from matplotlib import style
+    from matplotlib.figure import Figure
+
+    with style.context("dark_background"):
+        fig = Figure()
+        try:
+            ax = fig.subplots()
+            dibujar(ax)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", dpi=DPI, bbox_inches="tight")
+        finally:
+            fig.clear()
+    return buffer.getvalue()
+
+
+def _imagen(tipo, huella, dibujar):
+    with _imagenes_lock:
+        if huella in _imagenes:
+            _imagenes.move_to_end(huella)
+            metricas.sumar("grafico_cache_total", grafico=tipo, resultado="acierto")
+            return _imagenes[huella]
+    metricas.sumar("grafico_cache_total", grafico=tipo, resultado="fallo")
+    with metricas.medir("grafico_segundos", grafico=tipo):
+        png = _renderizar(dibujar)
+    with _imagenes_lock:
+        _imagenes[huella] = png
+        _imagenes.move_to_end(huella)
+        while len(_imagenes) > CACHE_MAX_IMAGENES:
+            _imagenes.popitem(last=False)
+    return png
+
+
+# === Gráficos de la app ===
+def barras_ingresos_vs_gastos(periodos, ingresos, gastos):
+    def dibujar(ax):
+        ax.bar(_a_lista(periodos), _a_lista(ingresos), label="Ingresos", color="#4CAF50")
+        ax.bar(_a_lista(periodos), _a_lista(gastos), label="Gastos", color="#F44336", alpha=0.7)
+        ax.set_title("Ingresos vs Gastos Totales por Mes")
+        ax.set_ylabel("CLP")
+        ax.legend()
+        ax.tick_params(axis='x', rotation=45)
+    return _imagen("barras", _huella("barras", periodos, ingresos, gastos), dibujar)
+
+
+def lineas_evolucion(periodos, ingresos, gastos, saldo):
+    def dibujar(ax):
+        ax.plot(_a_lista(periodos), _a_lista(ingresos), label="Ingresos", marker="o", color="#4CAF50")
+        ax.plot(_a_lista(periodos), _a_lista(gastos), label="Gastos Totales", marker="o", color="#F44336")
+        ax.plot(_a_lista(periodos), _a_lista(saldo), label="Saldo Disponible Real", marker="o", color="#2196F3")
+        ax.set_title("Evolución de Ingresos, Gastos y Saldo Real")
+        ax.set_ylabel("CLP")
+        ax.set_xlabel("Mes/Año")
+        ax.tick_params(axis="x", rotation=45)
+        ax.legend()
+    return _imagen("lineas", _huella("lineas", periodos, ingresos, gastos, saldo), dibujar)
+
+
+def torta(valores, etiquetas, titulo):
+    def dibujar(ax):
+        ax.pie(_a_lista(valores), labels=_a_lista(etiquetas), autopct="%1.1f%%", startangle=90)
+        ax.set_title(titulo)
+    return _imagen("torta", _huella("torta", valores, etiquetas, [titulo]), dibujar)
+
+
+def bandas_proyeccion(periodos, p5, p25, p50, p75, p95):
+    def dibujar(ax):
+        x = _a_lista(periodos)
+        ax.fill_between(x, _a_lista(p5), _a_lista(p95), color="#2196F3", alpha=0.2, label="90% de los escenarios")
+        ax.fill_between(x, _a_lista(p25), _a_lista(p75), color="#2196F3", alpha=0.4, label="50% de los escenarios")
+        ax.plot(x, _a_lista(p50), marker="o", color="#2196F3", label="Mediana")
+        ax.axhline(0, color="#F44336", linewidth=1, linestyle="--")
+        ax.set_title("Saldo proyectado acumulado")
+        ax.set_ylabel("CLP")
+        ax.tick_params(axis="x", rotation=45)
+        ax.legend()
+    return _imagen("bandas", _huella("bandas", periodos, p5, p25, p50, p75, p95), dibujar)
@@ -0,0 +1,145 @@
+# libro_cuentas.py
+import threading
+
+import pandas as pd
+
+from google_sheets import apply_schema, same_label
+
+CLAVE = ["cuenta", "año", "mes"]
+SIN_CUENTA = "(sin cuenta)"
+
+# Movimientos por hoja: (columna con la cuenta, monto con signo por fila).
+# Entra a la cuenta lo que se ingresa o se guarda en ella y sale lo que se paga.
+# "estado" se compara sin importar mayúsculas ni espacios.
+MOVIMIENTOS = {
+    "Ingresos": ("cuenta", lambda df: df["monto"]),
+    "Gastos Fijos": ("cuenta_pago", lambda df: -df["monto"].where(same_label(df["estado"], "pagado"), 0)),
+    "Ahorros": ("cuenta", lambda df: df["monto_ingreso"] - df["monto_retirado"]),
+    "Reservas Familiares": ("cuenta", lambda df: df["monto"]),
+}
+
+
+def _vacia():
+    return pd.DataFrame(
+        columns=list(MOVIMIENTOS), dtype="int64",
+        index=pd.MultiIndex.from_tuples([], names=CLAVE),
+    )
+
+
+def _filas_hoja(hoja, df):
+    # Una fila por registro: cuenta, año, mes, hoja y monto con signo
+    columna, monto = MOVIMIENTOS[hoja]
+    if df.empty or not {columna, "año", "mes"} <= set(df.columns):
+        return None
+    try:
+        montos = pd.to_numeric(monto(df), errors="coerce").fillna(0)
+    except KeyError:
+        return None
+    cuentas = df[columna].astype(object)
+    return pd.DataFrame({
+        "cuenta": cuentas.where(cuentas.notna(), SIN_CUENTA).to_numpy(),
+        "año": df["año"].to_numpy(),
+        "mes": df["mes"].to_numpy(),
+        "hoja": hoja,
+        "monto": montos.to_numpy(),
+    })
+
+
+def agrupar_movimientos(df_hojas):
+    # Todas las hojas se juntan en una tabla larga y se agrupan una sola vez:
+    # una fila por (cuenta, año, mes) y una columna por hoja
+    partes = [_filas_hoja(hoja, df) for hoja, df in df_hojas.items() if hoja in MOVIMIENTOS]
+    partes = [p for p in partes if p is not None]
+    if not partes:
+        return _vacia()
+    largo = pd.concat(partes, ignore_index=True)
+    tabla = largo.groupby(CLAVE + ["hoja"])["monto"].sum().unstack("hoja", fill_value=0)
+    return tabla.reindex(columns=list(MOVIMIENTOS), fill_value=0)
+
+
+class LibroCuentas:
+    # Movimientos y saldo acumulado de cada cuenta mes a mes. Se guarda lo que
+    # aporta cada hoja por separado, así que cuando cambia una hoja solo se
+    # vuelve a agrupar esa, y al guardar un mes desde el editor solo se
+    # reemplaza ese mes, sin recorrer el resto del historial.
+
+    def __init__(self):
+        self._movimientos = _vacia()
+        self._versiones = {}   # hoja -> versión con la que se calculó
+        self._saldos = None
+        self._lock = threading.Lock()
+
+    def _reemplazar(self, hojas, nuevos, filas=None):
+        # Cambia lo que aportan esas hojas (en todas las filas o solo en las de la máscara)
+        actual = self._movimientos.copy()
+        if filas is None:
+            actual[hojas] = 0
+        else:
+            actual.loc[filas, hojas] = 0
+        tabla = actual.add(nuevos.reindex(columns=actual.columns, fill_value=0), fill_value=0)
+        self._movimientos = tabla[(tabla != 0).any(axis=1)].sort_index().astype("int64")
+        self._saldos = None
+
+    def actualizar(self, version, leer):
+        # version(hoja) -> versión actual; leer(hojas) -> {hoja: DataFrame}.
+        # Solo se leen y agrupan las hojas que cambiaron desde la última vez.
+        with self._lock:
+            cambiadas = [h for h in MOVIMIENTOS if self._versiones.get(h, object()) != version(h)]
+            if not cambiadas:
+                return
+            self._reemplazar(cambiadas, agrupar_movimientos(leer(cambiadas)))
+            # La versión se toma después de leer (la primera lectura puede cambiarla)
+            self._versiones.update({h: version(h) for h in cambiadas})
+
+    def actualizar_mes(self, hoja, año, mes, df_mes, anterior, nueva):
+        # Guardado de un mes: si el libro estaba al día con la versión anterior
+        # de la hoja, basta con reemplazar ese mes. Si no, la próxima
+        # actualizar() vuelve a agrupar la hoja completa.
+        if hoja not in MOVIMIENTOS:
+            return
+        with self._lock:
+            if self._versiones.get(hoja, object()) != anterior:
+                return
+            indice = self._movimientos.index
+            filas = (indice.get_level_values("año") == año) & (indice.get_level_values("mes") == mes)
+            self._reemplazar([hoja], agrupar_movimientos({hoja: apply_schema(hoja, df_mes)}), filas)
+            self._versiones[hoja] = nueva
+
+    def saldos(self):
+        # Una fila por (cuenta, año, mes) con lo que aportó cada hoja, el
+        # movimiento neto del mes y el saldo acumulado de la cuenta
+        with self._lock:
+            if self._saldos is None:
+                tabla = self._movimientos.copy()
+                tabla["movimiento"] = tabla[list(MOVIMIENTOS)].sum(axis=1)
+                tabla["saldo"] = tabla.groupby(level="cuenta")["movimiento"].cumsum()
+                self._saldos = tabla
+            return self._saldos
+
+    def saldos_al(self, año, mes, cuentas=()):
+        # Saldo de cada cuenta al cierre del mes y su movimiento en ese mes.
+        # Las cuentas sin movimientos (p. ej. recién creadas) aparecen con 0.
+        tabla = self.saldos().reset_index()
+        # año y mes vienen como int16 / int8 desde apply_schema: año * 100 se
+        # desbordaría, así que el período se arma en int64
+        periodo = tabla["año"].astype("int64") * 100 + tabla["mes"].astype("int64")
+        hasta = tabla[periodo <= año * 100 + mes]
+        saldo = hasta.groupby("cuenta")["saldo"].last()
+        del_mes = hasta[(hasta["año"] == año) & (hasta["mes"] == mes)].set_index("cuenta")["movimiento"]
+        todas = list(dict.fromkeys(list(cuentas) + saldo.index.tolist()))
+        return pd.DataFrame({
+            "movimiento_mes": del_mes.reindex(todas, fill_value=0),
+            "saldo": saldo.reindex(todas, fill_value=0),
+        }, index=pd.Index(todas, name="cuenta")).astype("int64")
+
+
+# Un libro por almacén, compartido por todas las sesiones del proceso
+_libros = {}
+_libros_lock = threading.Lock()
+
+
+def libro_de(id_almacen):
+    with _libros_lock:
+        if id_almacen not in _libros:
+            _libros[id_almacen] = LibroCuentas()
+        return _libros[id_almacen]
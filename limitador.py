@@ -0,0 +1,115 @@
+# limitador.py
+import random
+import threading
+import time
+
+import gspread
+import requests
+import urllib3
+
+# Cuotas por defecto de la API de Google Sheets (por usuario y por minuto)
+LECTURAS_POR_MINUTO = 60
+ESCRITURAS_POR_MINUTO = 60
+
+# Reintentos ante 429 / 5xx: espera exponencial con jitter
+MAX_REINTENTOS = 5
+ESPERA_BASE = 1.0      # segundos
+ESPERA_MAXIMA = 32.0   # segundos
+
+
+class CubetaTokens:
+    # Cubeta de tokens: se llena a razón de por_minuto / 60 tokens por segundo
+    # y admite ráfagas de hasta por_minuto llamadas.
+
+    def __init__(self, por_minuto):
+        self.capacidad = float(por_minuto)
+        self.tasa = por_minuto / 60.0
+        self.tokens = self.capacidad
+        self._ultimo = time.monotonic()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self):
+        # Devuelve 0 si se tomó un token, o los segundos que faltan para el próximo
+        self._rellenar()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+
+def es_reintentable(error):
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def _sin_conectar(error):
+    # Falló al abrir la conexión: el request nunca llegó a Google
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        motivo = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(motivo, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def es_reintentable_escritura(error):
+    # Para escrituras que no se pueden repetir (batchUpdate con filas por
+    # índice): ante un 5xx o un timeout de lectura el cambio pudo aplicarse, y
+    # repetirlo borraría o agregaría filas de nuevo. Solo se reintenta si
+    # Google lo rechazó por cuota o si no se llegó a conectar.
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code == 429
+    return _sin_conectar(error)
+
+
+class Planificador:
+    # Reparte las llamadas a Google Sheets según las cuotas de lectura y escritura.
+    # Mientras haya una escritura esperando, las lecturas nuevas no avanzan,
+    # así un guardado no queda detrás de una cola de lecturas.
+
+    def __init__(self, lecturas_por_minuto=LECTURAS_POR_MINUTO, escrituras_por_minuto=ESCRITURAS_POR_MINUTO):
+        self._cubetas = {
+            "read": CubetaTokens(lecturas_por_minuto),
+            "write": CubetaTokens(escrituras_por_minuto),
+        }
+        self._cond = threading.Condition()
+        self._escrituras_esperando = 0
+
+    def adquirir(self, tipo):
+        with self._cond:
+            if tipo == "write":
+                self._escrituras_esperando += 1
+            try:
+                while True:
+                    if tipo == "read" and self._escrituras_esperando:
+                        self._cond.wait(0.1)
+                        continue
+                    espera = self._cubetas[tipo].tomar()
+                    if espera == 0:
+                        return
+                    self._cond.wait(espera)
+            finally:
+                if tipo == "write":
+                    self._escrituras_esperando -= 1
+                    self._cond.notify_all()
+
+    def ejecutar(self, tipo, fn, *args, reintentable=es_reintentable, **kwargs):
+        # Ejecuta fn respetando la cuota; ante 429 / 5xx reintenta con espera
+        # exponencial y jitter, volviendo a pasar por la cubeta en cada intento.
+        # reintentable(error) decide qué errores se reintentan.
+        intento = 0
+        while True:
+            self.adquirir(tipo)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if intento >= MAX_REINTENTOS or not reintentable(e):
+                    raise
+                espera = min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento)
+                time.sleep(random.uniform(espera / 2, espera))
+                intento += 1
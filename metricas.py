@@ -0,0 +1,123 @@
+# metricas.py
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# === Registro de métricas del proceso ===
+# Contadores (llamadas a la API, bytes, errores) y tiempos (latencia de la API,
+# secciones, cálculos, gráficos y exportaciones), cada uno con sus etiquetas.
+# Se acumulan en memoria mientras el proceso vive y se pueden ver en el panel
+# de depuración o exportar como JSON o en formato de texto de Prometheus.
+PREFIJO = "appgastos"
+
+_contadores = {}   # (nombre, etiquetas) -> valor
+_tiempos = {}      # (nombre, etiquetas) -> [cantidad, suma, máximo]
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _clave(nombre, etiquetas):
+    return (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+
+
+def sumar(nombre, valor=1, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+
+def observar(nombre, segundos, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        entrada = _tiempos.setdefault(clave, [0, 0.0, 0.0])
+        entrada[0] += 1
+        entrada[1] += segundos
+        entrada[2] = max(entrada[2], segundos)
+
+
+@contextmanager
+def medir(nombre, **etiquetas):
+    # Mide el bloque aunque termine con una excepción
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+
+@contextmanager
+def contexto(**etiquetas):
+    # Etiquetas de la operación en curso en este hilo (p. ej. para atribuir
+    # los bytes de una respuesta HTTP a la llamada y hoja que la pidió)
+    anteriores = getattr(_local, "etiquetas", None)
+    _local.etiquetas = etiquetas
+    try:
+        yield
+    finally:
+        _local.etiquetas = anteriores
+
+
+def etiquetas_actuales():
+    return getattr(_local, "etiquetas", None) or {}
+
+
+def reiniciar():
+    with _lock:
+        _contadores.clear()
+        _tiempos.clear()
+
+
+# === Exportación ===
+def resumen():
+    # Lista de series: {"nombre", "tipo", "etiquetas", ...valores}
+    with _lock:
+        contadores = list(_contadores.items())
+        tiempos = [(clave, list(valores)) for clave, valores in _tiempos.items()]
+    series = [
+        {"nombre": nombre, "tipo": "contador", "etiquetas": dict(etiquetas), "valor": valor}
+        for (nombre, etiquetas), valor in contadores
+    ]
+    series += [
+        {"nombre": nombre, "tipo": "tiempo", "etiquetas": dict(etiquetas),
+         "cantidad": cantidad, "suma": suma, "maximo": maximo, "promedio": suma / cantidad if cantidad else 0.0}
+        for (nombre, etiquetas), (cantidad, suma, maximo) in tiempos
+    ]
+    return sorted(series, key=lambda s: (s["nombre"], sorted(s["etiquetas"].items())))
+
+
+def a_json():
+    return json.dumps({"generado": time.time(), "series": resumen()}, ensure_ascii=False, indent=2)
+
+
+def _etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ""
+    partes = []
+    for k, v in sorted(etiquetas.items()):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def a_prometheus():
+    # Formato de texto de Prometheus: los contadores como counter y los tiempos
+    # como summary (_count / _sum) más un gauge _max. Cada familia va junta.
+    familias = {}
+    for serie in resumen():
+        familias.setdefault(serie["nombre"], []).append(serie)
+    lineas = []
+    for nombre, series in familias.items():
+        nombre = f"{PREFIJO}_{nombre}"
+        if series[0]["tipo"] == "contador":
+            lineas.append(f"# TYPE {nombre} counter")
+            lineas += [f"{nombre}{_etiquetas_prometheus(s['etiquetas'])} {s['valor']}" for s in series]
+            continue
+        lineas.append(f"# TYPE {nombre} summary")
+        for s in series:
+            etiquetas = _etiquetas_prometheus(s["etiquetas"])
+            lineas.append(f"{nombre}_count{etiquetas} {s['cantidad']}")
+            lineas.append(f"{nombre}_sum{etiquetas} {s['suma']:.6f}")
+        lineas.append(f"# TYPE {nombre}_max gauge")
+        lineas += [f"{nombre}_max{_etiquetas_prometheus(s['etiquetas'])} {s['maximo']:.6f}" for s in series]
+    return "\n".join(lineas) + "\n"
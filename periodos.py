@@ -0,0 +1,66 @@
+# periodos.py
+import numpy as np
+import pandas as pd
+
+
+class TablaPeriodos:
+    # Hoja indexada por (año, mes): las posiciones de cada mes se calculan una
+    # vez al cargar, y después cada consulta es un acceso directo sin recorrer
+    # toda la historia.
+
+    def __init__(self, df):
+        self.df = df
+        self.tiene_periodo = "mes" in df.columns and "año" in df.columns
+        self._meses = {}
+        self._años = {}
+        if self.tiene_periodo and not df.empty:
+            for (año, mes), posiciones in df.groupby(["año", "mes"], sort=False).indices.items():
+                self._meses[(año, mes)] = posiciones
+                self._años.setdefault(año, []).append(posiciones)
+            self._años = {año: np.sort(np.concatenate(partes)) for año, partes in self._años.items()}
+
+    def periodos(self):
+        return sorted(self._meses)
+
+    def posiciones_mes(self, año, mes):
+        return self._meses.get((año, mes), np.array([], dtype=np.intp))
+
+    def mes(self, año, mes):
+        # Filas de un mes (la hoja completa si no tiene columnas mes/año)
+        if not self.tiene_periodo:
+            return self.df.copy()
+        return self.df.iloc[self.posiciones_mes(año, mes)]
+
+    def año(self, año):
+        # Todas las filas de un año (la hoja completa si no tiene columnas mes/año)
+        if not self.tiene_periodo:
+            return self.df.copy()
+        return self.df.iloc[self._años.get(año, np.array([], dtype=np.intp))]
+
+    def reemplazar_mes(self, año, mes, df_nuevo):
+        # Reemplaza las filas del mes dejándolas en la misma posición de la hoja,
+        # así la escritura por diferencias solo envía lo que realmente cambió
+        posiciones = self.posiciones_mes(año, mes)
+        if len(posiciones) == 0:
+            return pd.concat([self.df, df_nuevo], ignore_index=True)
+        inicio = posiciones[0]
+        resto = self.df.iloc[inicio:].drop(index=self.df.index[posiciones])
+        return pd.concat([self.df.iloc[:inicio], df_nuevo, resto], ignore_index=True)
+
+
+def reemplazar_meses(df, meses):
+    # Aplica varios reemplazos {(año, mes): df_mes} en orden sobre la hoja completa
+    for (año, mes), df_mes in meses.items():
+        df = TablaPeriodos(df).reemplazar_mes(año, mes, df_mes)
+    return df
+
+
+# Tablas ya indexadas, reutilizadas entre reruns mientras la hoja no cambie
+_tablas = {}  # clave -> (version, TablaPeriodos)
+
+
+def tabla_periodos(clave, version, df):
+    entrada = _tablas.get(clave)
+    if entrada is None or entrada[0] != version:
+        entrada = _tablas[clave] = (version, TablaPeriodos(df))
+    return entrada[1]
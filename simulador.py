@@ -0,0 +1,55 @@
+# simulador.py
+import numpy as np
+import pandas as pd
+
+# === Proyección a varios meses (Monte Carlo) ===
+# Cada categoría se simula alrededor del monto estimado con la variabilidad
+# que tuvo en el historial (desviación relativa de sus totales mensuales).
+# Todos los escenarios y meses se generan de una vez como una matriz
+# escenarios × meses × categorías, así que miles de escenarios toman
+# milisegundos y la proyección se puede recalcular con cada input.
+ESCENARIOS = 5000
+PERCENTILES = (5, 25, 50, 75, 95)
+SEMILLA = 0   # fija: con los mismos inputs la proyección no cambia entre reruns
+
+# Columna de agregados -> signo en el saldo
+CATEGORIAS = {
+    "ingresos": 1,
+    "gastos_fijos": -1,
+    "deudas": -1,
+    "provisiones_guardadas": -1,
+    "ahorros_guardados": -1,
+}
+
+
+def variabilidad(agregados):
+    # Coeficiente de variación (desviación / promedio) de cada categoría en el historial.
+    # Con menos de dos meses, o sin montos, la categoría se toma como fija.
+    tabla = agregados.reindex(columns=list(CATEGORIAS)).fillna(0).astype(float)
+    if len(tabla) < 2:
+        return pd.Series(0.0, index=list(CATEGORIAS))
+    promedio = tabla.mean()
+    desviacion = tabla.std(ddof=1)
+    return (desviacion / promedio.where(promedio > 0)).fillna(0.0)
+
+
+def simular(estimados, coeficientes, meses, saldo_inicial=0, escenarios=ESCENARIOS, semilla=SEMILLA):
+    # estimados y coeficientes: categoría -> monto mensual / coeficiente de variación.
+    # Devuelve una fila por mes proyectado con los percentiles del saldo acumulado
+    # y la probabilidad de que el saldo quede negativo.
+    categorias = list(CATEGORIAS)
+    medias = np.array([float(estimados.get(c, 0)) for c in categorias])
+    desviaciones = medias * np.array([float(coeficientes.get(c, 0)) for c in categorias])
+    signos = np.array([CATEGORIAS[c] for c in categorias], dtype=float)
+
+    rng = np.random.default_rng(semilla)
+    montos = rng.normal(medias, desviaciones, size=(escenarios, meses, len(categorias)))
+    np.maximum(montos, 0, out=montos)   # ningún monto mensual es negativo
+
+    saldo = saldo_inicial + np.cumsum(montos @ signos, axis=1)   # escenarios × meses
+
+    bandas = np.percentile(saldo, PERCENTILES, axis=0)
+    resultado = pd.DataFrame(bandas.T, columns=[f"p{p}" for p in PERCENTILES])
+    resultado["prob_negativo"] = (saldo < 0).mean(axis=0)
+    resultado.index = pd.RangeIndex(1, meses + 1, name="mes_proyectado")
+    return resultado
@@ -0,0 +1,108 @@
+# snapshot.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Copia local de cada hoja tal como vino de Google Sheets (la grilla de valores,
+# comprimida). Por hoja se guarda:
+#   - revision:    modifiedTime de la planilla cuando su contenido cambió por última vez
+#   - verificado:  modifiedTime de la planilla la última vez que se confirmó la copia
+#   - huella:      hash del contenido, para saber si una relectura trajo cambios
+SNAPSHOT_PATH = os.path.join(".snapshot", "hojas.sqlite")
+
+
+def huella_valores(values):
+    contenido = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+class SnapshotStore:
+
+    def __init__(self, ruta=SNAPSHOT_PATH):
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS hojas (
+                    sheet_key TEXT NOT NULL,
+                    tab TEXT NOT NULL,
+                    revision TEXT,
+                    verificado TEXT,
+                    huella TEXT NOT NULL,
+                    guardado REAL NOT NULL,
+                    datos BLOB NOT NULL,
+                    PRIMARY KEY (sheet_key, tab)
+                )"""
+            )
+
+    def leer(self, sheet_key, tab):
+        # Devuelve {"revision", "verificado", "huella", "guardado", "values"} o None
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT revision, verificado, huella, guardado, datos FROM hojas WHERE sheet_key = ? AND tab = ?",
+                (sheet_key, tab),
+            ).fetchone()
+        if fila is None:
+            return None
+        revision, verificado, huella, guardado, datos = fila
+        return {
+            "revision": revision,
+            "verificado": verificado,
+            "huella": huella,
+            "guardado": guardado,
+            "values": json.loads(zlib.decompress(datos).decode("utf-8")),
+        }
+
+    def tiene(self, sheet_key):
+        # True si hay alguna hoja guardada de esa planilla
+        with self._lock:
+            fila = self._conn.execute("SELECT 1 FROM hojas WHERE sheet_key = ? LIMIT 1", (sheet_key,)).fetchone()
+        return fila is not None
+
+    def verificadas(self, sheet_key, tabs, modificado):
+        # Hojas cuya copia ya se confirmó contra esa versión de la planilla
+        if modificado is None or not tabs:
+            return set()
+        marcas = ",".join("?" * len(tabs))
+        with self._lock:
+            filas = self._conn.execute(
+                f"SELECT tab FROM hojas WHERE sheet_key = ? AND verificado = ? AND tab IN ({marcas})",
+                (sheet_key, modificado, *tabs),
+            ).fetchall()
+        return {tab for (tab,) in filas}
+
+    def guardar(self, sheet_key, tab, values, modificado=None):
+        # Solo reescribe los datos si cambiaron; si no, marca la copia como verificada
+        huella = huella_valores(values)
+        with self._lock, self._conn:
+            fila = self._conn.execute(
+                "SELECT huella FROM hojas WHERE sheet_key = ? AND tab = ?", (sheet_key, tab)
+            ).fetchone()
+            if fila is not None and fila[0] == huella:
+                if modificado is not None:
+                    self._conn.execute(
+                        "UPDATE hojas SET verificado = ? WHERE sheet_key = ? AND tab = ?",
+                        (modificado, sheet_key, tab),
+                    )
+                return
+            datos = zlib.compress(json.dumps(values, ensure_ascii=False).encode("utf-8"))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hojas (sheet_key, tab, revision, verificado, huella, guardado, datos) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sheet_key, tab, modificado, modificado, huella, time.time(), datos),
+            )
+
+    def olvidar(self, sheet_key, tab):
+        # Después de escribir en la hoja la copia local ya no coincide
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE hojas SET verificado = NULL WHERE sheet_key = ? AND tab = ?", (sheet_key, tab)
+            )
@@ -0,0 +1,48 @@
+# tests/test_app.py
+import pytest
+
+from benchmarks.correr import nueva_app, reiniciar_proceso
+from benchmarks.datos import generar_planilla
+from benchmarks.planilla_falsa import PlanillaFalsa, instalada
+
+
+@pytest.fixture
+def planilla(tmp_path, monkeypatch):
+    # La copia local (.snapshot) queda en una carpeta temporal
+    monkeypatch.chdir(tmp_path)
+    planilla = PlanillaFalsa(generar_planilla(300, desde=(2024, 1), hasta=(2025, 12)))
+    with instalada(planilla):
+        reiniciar_proceso()
+        yield planilla
+    reiniciar_proceso()
+
+
+def _en_mes(at, año, mes):
+    at.run()
+    at.selectbox(key="año_selector").set_value(año).run()
+    at.selectbox(key="mes_selector").set_value(mes).run()
+    return at
+
+
+def _metricas(at):
+    return [m.value for m in at.metric]
+
+
+def test_recargar_trae_lo_editado_directo_en_la_planilla(planilla):
+    at = _en_mes(nueva_app("sheets"), 2025, 3)
+    at.run()
+    antes = _metricas(at)
+
+    # Alguien cambia los ingresos de 3/2025 directamente en Google Sheets
+    ingresos = planilla.pestaña("Ingresos")
+    encabezados = ingresos.filas[0]
+    monto, mes, año = (encabezados.index(c) for c in ("monto", "mes", "año"))
+    for fila in ingresos.filas[1:]:
+        if (fila[año], fila[mes]) == ("2025", "3"):
+            fila[monto] = str(int(fila[monto]) + 1000)
+    planilla._modificada()
+
+    [b for b in at.sidebar.button if "Recargar datos" in b.label][0].click().run()
+
+    assert not at.exception
+    assert _metricas(at) != antes
@@ -0,0 +1,34 @@
+# tests/test_cola_escritura.py
+import pandas as pd
+
+from almacenamiento import AlmacenSQLite
+from cola_escritura import AlmacenDiferido
+
+
+def test_version_no_cambia_al_escribir_lo_encolado(tmp_path):
+    # Lo que se lee a través de la cola ya incluye el guardado: cuando se
+    # escribe, la versión se mantiene y los cálculos derivados siguen valiendo
+    base = AlmacenSQLite(str(tmp_path / "finanzas.sqlite"))
+    base.guardar("Ingresos", pd.DataFrame({
+        "descripcion": ["sueldo", "sueldo"],
+        "monto": [1000, 1000],
+        "cuenta": ["Cuenta Corriente"] * 2,
+        "mes": [1, 2],
+        "año": [2025, 2025],
+    }))
+    cola = AlmacenDiferido(base)
+
+    df_mes = cola.leer_mes("Ingresos", 2025, 2)
+    df_mes["monto"] = 1500
+    cola.guardar_mes("Ingresos", 2025, 2, df_mes)
+    version = cola.version("Ingresos")
+    antes = cola.leer("Ingresos")
+
+    assert cola.esperar(timeout=10)
+    assert base.leer_mes("Ingresos", 2025, 2)["monto"].tolist() == [1500]
+    assert cola.version("Ingresos") == version
+    pd.testing.assert_frame_equal(cola.leer("Ingresos"), antes)
+
+    # Un cambio que no pasó por la cola sí cambia la versión
+    base.guardar_mes("Ingresos", 2025, 1, base.leer_mes("Ingresos", 2025, 1).assign(monto=900))
+    assert cola.version("Ingresos") != version
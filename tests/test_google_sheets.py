@@ -0,0 +1,60 @@
+# tests/test_google_sheets.py
+import pandas as pd
+import pytest
+
+import google_sheets
+import limitador
+from benchmarks.planilla_falsa import _error_api
+from google_sheets import _df_to_grid, apply_schema, same_label
+
+
+def test_apply_schema_conserva_el_texto_que_se_vuelve_a_escribir():
+    grid = [
+        ["item", "monto", "estado", "cuenta_pago", "mes", "año"],
+        ["luz", 100, "Pagado", "Banco A ", 1, 2025],
+        ["agua", 200, "pendiente", "", 1, 2025],
+        ["gas", 300, "PAGADO ", "Banco A", 1, 2025],
+    ]
+    df = apply_schema("Gastos Fijos", pd.DataFrame(grid[1:], columns=grid[0]))
+
+    assert _df_to_grid(df) == grid
+    assert same_label(df["estado"], "pagado").tolist() == [True, False, True]
+
+
+class _PlanillaQueFalla:
+    def __init__(self, id, error):
+        self.id = id
+        self.error = error
+        self.llamadas = []
+
+    def values_batch_get(self, ranges, params=None):
+        self.llamadas.append("values_batch_get")
+        raise self.error
+
+    def values_get(self, rango, params=None):
+        self.llamadas.append("values_get")
+        return {"values": [["monto", "mes", "año"], ["100", "1", "2025"]]}
+
+
+@pytest.fixture
+def sin_reintentos(monkeypatch):
+    monkeypatch.setattr(limitador, "MAX_REINTENTOS", 0)
+    monkeypatch.setattr(google_sheets, "snapshot", None)
+
+
+def test_batch_con_hoja_inexistente_se_lee_hoja_por_hoja(sin_reintentos):
+    planilla = _PlanillaQueFalla("prueba-400", _error_api(400, "Unable to parse range"))
+
+    dfs = google_sheets.read_sheets_as_dfs(planilla, ["Ingresos", "Deudas"])
+
+    assert planilla.llamadas == ["values_batch_get", "values_get", "values_get"]
+    assert dfs["Ingresos"]["monto"].tolist() == [100]
+
+
+def test_batch_sin_cuota_no_multiplica_las_llamadas(sin_reintentos):
+    planilla = _PlanillaQueFalla("prueba-429", _error_api(429, "Quota exceeded"))
+
+    dfs = google_sheets.read_sheets_as_dfs(planilla, ["Ingresos", "Deudas"])
+
+    assert planilla.llamadas == ["values_batch_get"]
+    assert all(len(df.columns) == 0 for df in dfs.values())
@@ -0,0 +1,28 @@
+# tests/test_libro_cuentas.py
+import pandas as pd
+
+from google_sheets import apply_schema
+from libro_cuentas import LibroCuentas
+
+
+def _libro(df_hojas):
+    libro = LibroCuentas()
+    libro.actualizar(lambda hoja: 1, lambda hojas: {h: df_hojas.get(h, pd.DataFrame()) for h in hojas})
+    return libro
+
+
+def test_saldos_al_corta_en_el_mes_pedido():
+    # año llega como int16 desde apply_schema: año * 100 no debe desbordarse
+    ingresos = apply_schema("Ingresos", pd.DataFrame({
+        "descripcion": ["a", "b", "c"],
+        "monto": [100, 200, 300],
+        "cuenta": ["Cuenta Corriente"] * 3,
+        "mes": [1, 2, 3],
+        "año": [2025] * 3,
+    }))
+    assert ingresos["año"].dtype == "int16"
+
+    saldos = _libro({"Ingresos": ingresos}).saldos_al(2025, 2)
+
+    assert saldos.loc["Cuenta Corriente", "saldo"] == 300
+    assert saldos.loc["Cuenta Corriente", "movimiento_mes"] == 200
@@ -0,0 +1,55 @@
+# vistas.py
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+import metricas
+
+
+class RegistroVistas:
+    # Secciones de la app registradas como funciones. A diferencia de st.tabs,
+    # que ejecuta el cuerpo de todas las pestañas en cada rerun, aquí solo se
+    # ejecuta la sección seleccionada.
+
+    def __init__(self, clave):
+        self.clave = clave
+        self._vistas = {}
+
+    def vista(self, nombre):
+        def registrar(fn):
+            self._vistas[nombre] = fn
+            return fn
+        return registrar
+
+    def mostrar(self):
+        nombre = st.radio(
+            "Sección", list(self._vistas),
+            horizontal=True, key=self.clave, label_visibility="collapsed",
+        )
+        with metricas.medir("seccion_segundos", seccion=nombre):
+            self._vistas[nombre]()
+
+
+# === Resultados memorizados ===
+# Cálculos de las vistas guardados por una clave que incluye sus entradas
+# (versiones de las hojas, mes, año...). Mientras las entradas no cambien,
+# volver a una sección no recalcula nada.
+MEMO_MAX_ENTRIES = 64
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def memoizar(clave, calcular):
+    with _memo_lock:
+        if clave in _memo:
+            _memo.move_to_end(clave)
+            return _memo[clave]
+    valor = calcular()
+    with _memo_lock:
+        _memo[clave] = valor
+        _memo.move_to_end(clave)
+        while len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+    return valor